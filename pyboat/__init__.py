@@ -9,13 +9,28 @@ __version__ = '0.8.0.3'
 from .api import WAnalyzer
 
 # the core functions
-from .core import sinc_smooth
+from .core import sinc_smooth, sinc_detrend_frame, auto_sinc_M
+from .core import normalize_frame
 from .core import sliding_window_amplitude
 from .core import normalize_with_envelope
 from .core import compute_spectrum
-from .core import get_maxRidge_ys
+from .core import compute_spectra
+from .core import FilterBank
+from .core import compute_power, wlet_at
+from .core import compute_ridge
+from .core import iter_spectrum_chunks, compute_spectrum_chunked
+from .core import OnlineCWT
+from .core import SpectrumResult
+from .core import get_maxRidge_ys, find_ridge_dp, find_ridge_coarse_to_fine
 from .core import eval_ridge
 from .core import interpolate_NaNs
+from .core import ar1_estimate, ar1_confidence, significant_fraction
+from .core import ridge_significance, significant_ridge
+from .core import cache_info, clear_cache, set_cache_limit
+
+# headless batch analysis
+from .ensemble import analyze_signal, ensemble_ridges
+from .surrogates import surrogate_quantiles, ensemble_surrogate_quantiles
 
 # ------------------------------
 # --- entry point for the UI ---
@@ -49,7 +49,10 @@ class WAnalyzer:
             L = None,
             p_max=None,
             time_unit_label="a.u.",            
-            M=None
+            M=None,
+            filter_bank=None,
+            dtype=complex,
+            n_workers=None,
     ):
 
         """
@@ -72,7 +75,19 @@ class WAnalyzer:
         time_unit_label: the string label for the time unit 
 
         M         : Length of the sinc filter window, defaults to length
-                     of input signal. Set to a lower value to speed up sinc-detrending.
+                     of input signal. Set to a lower value to speed up sinc-detrending,
+                     or to 'auto' for the shortest window within a 1% error
+                     of the ideal low-pass, see core.auto_sinc_M.
+
+        filter_bank : a core.FilterBank with precomputed wavelets,
+                      if None one gets created with the first signal and
+                      is reused for all following signals of the same length
+
+        dtype     : complex dtype of the Wavelet transform, np.complex64 
+                    halves the memory, see core.compute_spectrum
+
+        n_workers : number of threads for the Wavelet transform,
+                    -1 uses all cores, see core.compute_spectrum
 
         """
         
@@ -89,6 +104,9 @@ class WAnalyzer:
         self.L = L
         self.p_max = p_max
         self.M = M
+        self.filter_bank = filter_bank
+        self.dtype = dtype
+        self.n_workers = n_workers
 
         self.time_unit_label = time_unit_label
 
@@ -99,14 +117,42 @@ class WAnalyzer:
 
         self.ax_signal = None
         self.ax_spec = None
-        self.wlet = None
+        # the core.SpectrumResult
+        self.result = None
+
+    @property
+    def wlet(self):
+        return None if self.result is None else self.result.wlet
+
+    @wlet.setter
+    def wlet(self, wlet):
+        self._spectrum_result().wlet = wlet
+
+    @property
+    def modulus(self):
+        return None if self.result is None else self.result.modulus
+
+    @modulus.setter
+    def modulus(self, modulus):
+        self._spectrum_result().modulus = modulus
+
+    def _spectrum_result(self):
+
+        """ The SpectrumResult the wlet and modulus setters write through to """
+
+        if self.result is None:
+            raise ValueError("Need to compute a wavelet spectrum first!")
+
+        return self.result
 
     def compute_spectrum(self,
                          raw_signal,
                          sinc_detrend=True,
                          norm_amplitude = False,
                          do_plot=True,
-                         draw_coi=False):
+                         draw_coi=False,
+                         power_only=False,
+                         out=None):
 
         """
         Computes the Wavelet spectrum for a given *signal* for the given *periods*
@@ -125,14 +171,22 @@ class WAnalyzer:
 
         draw_coi: boolean, set to True if cone of influence 
                            shall be drawn on the wavelet power spectrum
+
+        power_only: boolean, if True only the power spectrum gets computed
+                    and self.wlet stays None, the complex transform 
+                    gets then evaluated along the ridge only
+
+        out: optional target for the power spectrum, a np.memmap 
+             or a file path to write a .npy file to,
+             see core.open_out
                    
         
         After a successful analysis, the analyser instance updates 
 
-        self.wlet 
-        self.modulus
+        self.result
 
-        with the results.
+        with a core.SpectrumResult, self.wlet and self.modulus
+        give the transform and the power spectrum.
         
         """
 
@@ -148,7 +202,31 @@ class WAnalyzer:
 
         self.ana_signal = ana_signal
 
-        modulus, wlet = core.compute_spectrum(ana_signal, self.dt, self.periods)
+        # reuse the wavelets for signals of the same length
+        if self.filter_bank is None or not self.filter_bank.matches(
+            len(ana_signal), self.dt, self.periods, dtype=self.dtype
+        ):
+            self.filter_bank = core.FilterBank(
+                len(ana_signal), self.dt, self.periods, dtype=self.dtype
+            )
+
+        if power_only:
+            modulus = core.compute_power(
+                ana_signal, self.dt, self.periods, filter_bank=self.filter_bank, out=out
+            )
+            result = core.SpectrumResult(
+                None, ana_signal, self.periods, self.dt, modulus=modulus
+            )
+        else:
+            result = core.compute_spectrum(
+                ana_signal,
+                self.dt,
+                self.periods,
+                filter_bank=self.filter_bank,
+                out=out,
+                n_workers=self.n_workers,
+                as_result=True,
+            )
 
         if do_plot:
 
@@ -159,7 +237,7 @@ class WAnalyzer:
                 axs,
                 time_vector=tvec,
                 signal=ana_signal,
-                modulus=modulus,
+                modulus=result,
                 periods=self.periods,
                 p_max=self.p_max,
             )
@@ -172,8 +250,7 @@ class WAnalyzer:
                 coi_m = core.Morlet_COI()
                 pl.draw_COI(axs[1], time_vector=tvec, coi_slope=coi_m)
 
-        self.wlet = wlet
-        self.modulus = modulus
+        self.result = result
         self._has_spec = True
 
     def get_maxRidge(self, power_thresh=0, smoothing_wsize=None):
@@ -189,11 +266,6 @@ class WAnalyzer:
             print("Need to compute a wavelet spectrum first!")
             return
 
-        # for easy integration
-        modulus = self.modulus
-
-        Nt = modulus.shape[1]  # number of time points
-        tvec = np.arange(Nt) * self.dt
 
         # ================ridge detection=====================================
 
@@ -204,14 +276,62 @@ class WAnalyzer:
         if smoothing_wsize % 2 == 0:
             smoothing_wsize = smoothing_wsize + 1
         
-        ridge_y = core.get_maxRidge_ys(modulus)
+        ridge_y = self.result.ridge_y
+
+        # power only spectrum, get the transform along the ridge
+        if self.wlet is None:
+            wlet = core.wlet_at(
+                self.ana_signal,
+                self.dt,
+                self.periods,
+                ridge_y,
+                filter_bank=self.filter_bank,
+            )
+            rd = core.eval_ridge(
+                ridge_y,
+                wlet,
+                self.ana_signal,
+                self.periods,
+                tvec=self.result.tvec,
+                power_thresh=power_thresh,
+                smoothing_wsize=smoothing_wsize,
+            )
+        else:
+            rd = self.result.get_ridge(power_thresh, smoothing_wsize)
+
+        self.ridge_data = rd
+        self._has_ridge = True
+
+        # return also directly
+        return rd
+
+    def get_dpRidge(self, max_jump=3, curve_pen=0, power_thresh=0, smoothing_wsize=None):
+
+        """
+        Computes the optimal ridge under the annealing cost
+        exactly by dynamic programming, see core.find_ridge_dp.
+
+        max_jump  : maximal jump in scale direction per time step
+        curve_pen : penalty for the curvature of the ridge
+
+        Returns the ridge_data dictionary (see core.eval_ridge)!
+        """
+
+        if not self._has_spec:
+            print("Need to compute a wavelet spectrum first!")
+            return
+
+        if self.wlet is None:
+            print("Need the complex transform, don't use power_only!")
+            return
+
+        ridge_y, cost = core.find_ridge_dp(
+            self.modulus, max_jump=max_jump, curve_pen=curve_pen
+        )
 
         rd = core.eval_ridge(
             ridge_y,
-            self.wlet,
-            self.ana_signal,
-            self.periods,
-            tvec=tvec,
+            self.result,
             power_thresh=power_thresh,
             smoothing_wsize=smoothing_wsize,
         )
@@ -219,7 +339,6 @@ class WAnalyzer:
         self.ridge_data = rd
         self._has_ridge = True
 
-        # return also directly
         return rd
 
     def plot_readout(self, draw_coi = False, num=None):
@@ -234,18 +353,130 @@ class WAnalyzer:
 
         pl.plot_readout(self.ridge_data, time_unit=self.time_unit_label, draw_coi = draw_coi)
 
-    def get_annealRidge(self):
+    def get_annealRidge(
+        self,
+        ini_per=None,
+        restarts=1,
+        n_workers=None,
+        seed=None,
+        patience=None,
+        power_thresh=0,
+        smoothing_wsize=None,
+        **anneal_pars,
+    ):
 
-        """ not implemented yet """
+        """
+        Ridge detection by simulated annealing, see core.find_ridge_anneal.
+
+        ini_per     : period of the initial straight line ridge, defaults
+                      to the maximum of the time averaged power
+        restarts    : number of independent annealings, the ridge
+                      with the lowest cost gets kept
+        n_workers   : number of processes for the restarts
+        seed        : seed for the random streams of the restarts
+        patience    : stop after that many consecutive rejected moves
+        anneal_pars : override the defaults of *ridge_def_dic*,
+                      'Temp_ini', 'Nsteps', 'max_jump' and 'curve_pen'
+
+        Returns the ridge_data dictionary (see core.eval_ridge)!
+        """
 
         if not self._has_spec:
             print("Need to compute a wavelet spectrum first!")
             return
 
-        ridge_y, cost = core.find_ridge_anneal(
-            self.modulus, y0, ini_T, Nsteps, mx_jump=max_jump, curve_pen=curve_pen
+        if self.wlet is None:
+            print("Need the complex transform, don't use power_only!")
+            return
+
+        pars = dict(ridge_def_dic, **anneal_pars)
+
+        if ini_per is None:
+            y0 = int(np.argmax(self.result.time_averaged))
+        else:
+            y0 = int(np.argmin(np.abs(self.periods - ini_per)))
+
+        ridge_y, cost = core.find_ridge_anneal_restarts(
+            self.modulus,
+            y0,
+            pars["Temp_ini"],
+            int(pars["Nsteps"]),
+            restarts=restarts,
+            n_workers=n_workers,
+            seed=seed,
+            mx_jump=int(pars["max_jump"]),
+            curve_pen=pars["curve_pen"],
+            patience=patience,
         )
 
+        rd = core.eval_ridge(
+            ridge_y,
+            self.result,
+            power_thresh=power_thresh,
+            smoothing_wsize=smoothing_wsize,
+        )
+
+        self.ridge_data = rd
+        self._has_ridge = True
+
+        return rd
+
+    def get_coarseRidge(
+        self, method="dp", ini_per=None, power_thresh=0, smoothing_wsize=None, **ridge_pars
+    ):
+
+        """
+        Coarse to fine ridge detection, the ridge gets searched on the
+        modulus subsampled by 'sub_s' and 'sub_t' and refined at full
+        resolution, see core.find_ridge_coarse_to_fine.
+
+        method     : 'dp' or 'anneal' for the coarse search
+        ini_per    : period of the initial straight line ridge for 
+                     the annealing, defaults to the maximum of the 
+                     time averaged power
+        ridge_pars : override the defaults of *ridge_def_dic*
+
+        Returns the ridge_data dictionary (see core.eval_ridge)!
+        """
+
+        if not self._has_spec:
+            print("Need to compute a wavelet spectrum first!")
+            return
+
+        if self.wlet is None:
+            print("Need the complex transform, don't use power_only!")
+            return
+
+        pars = dict(ridge_def_dic, **ridge_pars)
+
+        y0 = None
+        if ini_per is not None:
+            y0 = int(np.argmin(np.abs(self.periods - ini_per)))
+
+        ridge_y, cost = core.find_ridge_coarse_to_fine(
+            self.modulus,
+            sub_s=int(pars["sub_s"]),
+            sub_t=int(pars["sub_t"]),
+            max_jump=int(pars["max_jump"]),
+            curve_pen=pars["curve_pen"],
+            method=method,
+            y0=y0,
+            T_ini=pars["Temp_ini"],
+            Nsteps=int(pars["Nsteps"]),
+        )
+
+        rd = core.eval_ridge(
+            ridge_y,
+            self.result,
+            power_thresh=power_thresh,
+            smoothing_wsize=smoothing_wsize,
+        )
+
+        self.ridge_data = rd
+        self._has_ridge = True
+
+        return rd
+
     def draw_Ridge(self):
 
         if not self._has_ridge:
@@ -348,9 +579,7 @@ class WAnalyzer:
             print("Need to compute a wavelet spectrum first!")
             return
 
-        mfourier = np.sum(self.modulus, axis=1) / self.modulus.shape[1]
-
-        return mfourier
+        return self.result.time_averaged
 
     def draw_AR1_confidence(self, alpha):
 
@@ -358,18 +587,11 @@ class WAnalyzer:
             print("Need to compute a wavelet spectrum first!")
             return
 
-        tvec = np.arange(self.wlet.shape[1]) * self.dt
+        tvec = self.result.tvec
         x, y = np.meshgrid(tvec, self.periods)  # for plotting the wavelet transform
 
         ar1power = core.ar1_powerspec(alpha, self.periods, self.dt)
-        conf95 = xi2_95 / 2.0
-        conf99 = xi2_99 / 2.0
-
-        scaled_mod = np.zeros(self.modulus.shape)
-
-        # maybe there is a more clever way
-        for i, col in enumerate(self.modulus.T):
-            scaled_mod[:, i] = col / ar1power
+        scaled_mod = self.modulus / ar1power[:, None]
 
         CS = self.ax_spec.contour(
             x,
@@ -391,10 +613,29 @@ class WAnalyzer:
         )
 
         # check confidence levels on (long) ar1 realisations !
-        # print (len(where(scaled_mod > conf95)[0])/prod(wlet.shape))
-        # should be ~0.05
-        # print (len(where(scaled_mod > conf99)[0])/prod(wlet.shape))
-        # should be ~0.01
+        # get_AR1_confidence masks should have means ~0.05 and ~0.01
+
+    def get_AR1_confidence(self, alpha=None):
+
+        """
+        Boolean masks of the spectrum, True where the power
+        is significant against an AR1 background at the
+        95% and 99% level, see core.ar1_confidence. 
+
+        alpha : the AR1 parameter, if None it gets estimated
+                from the analyzed signal
+
+        Returns mask95, mask99
+        """
+
+        if not self._has_spec:
+            print("Need to compute a wavelet spectrum first!")
+            return
+
+        if alpha is None:
+            alpha = core.ar1_estimate(self.ana_signal)
+
+        return core.ar1_confidence(self.result, alpha)
 
     def get_trend(self, signal):
 
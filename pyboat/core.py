@@ -8,12 +8,20 @@
 # Version 0.7 March 2020, Gregor Moenke (gregor.moenke@embl.de)
 ###########################################################################
 
+import os
 import numpy as np
 from numpy.fft import rfft, rfftfreq, fft
+from scipy.fft import fft as sp_fft, ifft as sp_ifft, next_fast_len
 from numpy.random import uniform, randn, randint, choice
 from numpy import pi
-from scipy.signal import savgol_filter
+from scipy.signal import savgol_filter, firwin, resample_poly, fftconvolve, lfilter
+from scipy.interpolate import CubicSpline
+from scipy.ndimage import maximum_filter1d, minimum_filter1d
 import pandas as pd
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+from threading import RLock
 
 # global variables
 # -----------------------------------------------------------
@@ -24,10 +32,32 @@ xi2_99 = 9.21
 # clip Wavelets at 1/peak_fraction envelope
 peak_fraction = 1e6
 clip_support = True
+
+# multirate CWT, minimal scale in samples after decimation
+mr_min_scale = 8
+
+# signal length times window length above which
+# smooth convolves via FFT
+fft_smooth_threshold = 2 ** 20
+
+# maximal scale jump of the DP ridge, memory and work
+# grow with its square per time point
+dp_max_jump = 10
 # -----------------------------------------------------------
 
 
-def compute_spectrum(signal, dt, periods):
+def compute_spectrum(
+    signal,
+    dt,
+    periods,
+    engine="direct",
+    filter_bank=None,
+    dtype=complex,
+    out=None,
+    wlet_out=None,
+    n_workers=None,
+    as_result=False,
+):
 
     """
 
@@ -45,6 +75,35 @@ def compute_spectrum(signal, dt, periods):
         periods : the list of periods to compute the Wavelet spectrum for, 
                   must have same units as dt!
 
+        engine  : either 'direct', 'fft' or 'multirate', see CWT
+                  'fft' is much faster for long signals and large periods,
+                  'multirate' for periods spanning many samples
+
+        filter_bank : optional FilterBank holding the precomputed 
+                      wavelets, must match the signal length, 
+                      *dt* and *periods*. Overrides *engine* and *dtype*.
+
+        dtype   : complex dtype of the Wavelet transform, use np.complex64 
+                  to halve the memory, the modulus is then float32. 
+                  Relative deviations of the power are ~1e-6, ridge periods 
+                  only differ for (near) degenerate maxima and phases 
+                  by ~1e-6 rad.
+
+        out     : optional target for the modulus, either an array 
+                  (e.g. a np.memmap) of the right shape and dtype, 
+                  or a file path for a new .npy file which gets 
+                  memory mapped, see open_out
+
+        wlet_out : optional target for the complex transform, as *out*
+
+        n_workers : number of threads computing disjoint sets of 
+                    periods in parallel, -1 uses all cores.
+                    Defaults to a single thread.
+
+        as_result : if True returns a SpectrumResult instead, 
+                    which computes the modulus and further 
+                    readouts only when needed
+
 
         Returns
         -------
@@ -57,26 +116,443 @@ def compute_spectrum(signal, dt, periods):
         
         """
 
-    if periods[0] < 2 * dt:
-        print()
-        print(f"Warning, Nyquist limit is {2*dt:.2f}!!")
-        print()
+    dt = float(dt)
+    signal, periods, scales, dtype, sig2 = prepare_transform(
+        signal, dt, periods, filter_bank, dtype
+    )
+    Nt = len(signal)  # number of time points
 
-    # -- subtract the mean --
-    signal = np.array(signal) - np.mean(signal)
+    # write block by block into the targets
+    if out is not None or wlet_out is not None or n_threads(n_workers) > 1:
+        shape = (len(periods), Nt)
+        modulus = open_out(out, shape, real_dtype(dtype))
+        wlet = open_out(wlet_out, shape, dtype)
+
+        def store(rows, block):
+            wlet[rows] = block
+            modulus[rows] = np.abs(block) ** 2 / sig2
+
+        if n_threads(n_workers) > 1:
+            parallel_transform(
+                signal,
+                scales,
+                store,
+                n_workers,
+                engine=engine,
+                dtype=dtype,
+                filter_bank=filter_bank,
+            )
+        else:
+            for rows, block in iter_transform(
+                signal, scales, engine, dtype, filter_bank=filter_bank
+            ):
+                store(rows, block)
+
+        flush_out(modulus, wlet)
+        if as_result:
+            return SpectrumResult(wlet, signal, periods, dt, modulus=modulus)
+        return modulus, wlet
+
+    if filter_bank is not None:
+        wlet = filter_bank.transform(signal)
+    else:
+        Morlet = mk_Morlet(omega0)
+        # complex wavelet transform
+        wlet = CWT(signal, Morlet, scales, engine=engine, dtype=dtype)
+
+    result = SpectrumResult(wlet, signal, periods, dt)
+    if as_result:
+        return result
+
+    return result.modulus, result.wlet
+
+
+def compute_spectra(
+    signals, dt, periods, filter_bank=None, dtype=complex, out=None
+):
+
+    """
+
+        Computes the Wavelet power spectra for an ensemble of 
+        *signals* of equal length for the given *periods*. 
+        Uses the 'fft' engine of the CWT, the wavelet kernels 
+        and the signal transforms are computed only once 
+        for the whole ensemble.
+
+        Parameters
+        ----------
+
+        signals : 2d ndarray with dimensions Nsignals x Nt, or
+                  a DataFrame holding one signal per column,
+                  missing values are not allowed
+
+        dt      : the sampling interval scaled to desired time units
+
+        periods : the list of periods to compute the Wavelet spectrum for, 
+                  must have same units as dt!
+
+        filter_bank : optional FilterBank holding the precomputed 
+                      wavelets, must match the signal length, 
+                      *dt* and *periods*. Overrides *dtype*.
+
+        dtype   : complex dtype of the Wavelet transforms, 
+                  see compute_spectrum
+
+        out     : optional target for the power spectra, 
+                  an array or a file path, see compute_spectrum
+
+
+        Returns
+        -------
+
+        modulus : 3d ndarray of reals with dimensions 
+                  Nsignals x len(periods) x Nt, the Wavelet power 
+                  spectra normalized by the individual signal variances
+
+        """
+
+    if isinstance(signals, pd.DataFrame):
+        signals = signals.to_numpy().T
+
+    signals = np.atleast_2d(np.array(signals, dtype=float))
+
+    if np.any(np.isnan(signals)):
+        raise ValueError("Missing values in signals, interpolate or split first!")
+
+    # -- subtract the means --
+    signals = signals - signals.mean(axis=1, keepdims=True)
 
     periods = np.array(periods)
     dt = float(dt)
-    sfreq = 1 / dt  # the sampling frequency
+    Nsignals, Nt = signals.shape
+    check_periods(Nt, dt, periods, filter_bank)
 
-    Nt = len(signal)  # number of time points
+    # shared by all signals
+    if filter_bank is None:
+        filter_bank = FilterBank(Nt, dt, periods, engine="fft", dtype=dtype)
+
+    rdtype = real_dtype(filter_bank.dtype)
+    signals = signals.astype(rdtype)
+
+    if filter_bank.engine == "fft":
+        signals_ft = sp_fft(signals, n=filter_bank.nfft, axis=-1)
+
+    # white noise has then mean power of one
+    sig2 = np.var(signals, axis=1)
+
+    modulus = open_out(out, (Nsignals, len(periods), Nt), rdtype)
+    for i in range(Nsignals):
+        if filter_bank.engine == "fft":
+            wlet = filter_bank.transform(signals[i], signal_ft=signals_ft[i])
+        else:
+            wlet = filter_bank.transform(signals[i])
+        modulus[i] = np.abs(wlet) ** 2 / sig2[i]
+
+    flush_out(modulus)
+    return modulus
+
+
+def compute_power(
+    signal,
+    dt,
+    periods,
+    engine="direct",
+    filter_bank=None,
+    dtype=complex,
+    block_size=32,
+    out=None,
+):
+
+    """
+    Computes only the Wavelet power spectrum for a given *signal* 
+    for the given *periods*, the complex transform gets never 
+    materialized as a whole but only in blocks of *block_size* periods.
+
+    Use wlet_at to retrieve the complex transform 
+    at individual points, e.g. along a ridge.
+
+    Parameters are as for compute_spectrum, *out* can be
+    a (memory mapped) array or a file path.
+
+    Returns
+    -------
+
+    modulus : 2d ndarray of reals, 
+              the Wavelet power spectrum normalized by signal variance
+    """
+
+    signal, periods, scales, dtype, sig2 = prepare_transform(
+        signal, dt, periods, filter_bank, dtype
+    )
+
+    modulus = open_out(out, (len(periods), len(signal)), real_dtype(dtype))
+    for rows, block in iter_transform(
+        signal, scales, engine, dtype, block_size, filter_bank
+    ):
+        modulus[rows] = np.abs(block) ** 2 / sig2
+
+    flush_out(modulus)
+    return modulus
+
+
+def compute_ridge(
+    signal,
+    dt,
+    periods,
+    power_thresh=0,
+    smoothing_wsize=None,
+    engine="direct",
+    filter_bank=None,
+    dtype=complex,
+    block_size=32,
+):
+
+    """
+    Computes the maximum ridge readout of *signal* without materializing 
+    the Wavelet spectrum. Iterates over blocks of *block_size* periods, 
+    keeping only the running maximal power per time point, its period 
+    index and the complex transform at that position. Memory hence 
+    only scales with the number of time points.
+
+    The result is identical to
+
+    modulus, wlet = compute_spectrum(signal, dt, periods)
+    ridge_y = get_maxRidge_ys(modulus)
+    eval_ridge(ridge_y, wlet, signal, periods, tvec, ..)
+
+    Parameters are as for compute_spectrum and eval_ridge, with 
+    the time vector constructed from *dt*. Without a *filter_bank* 
+    the wavelets get created block by block.
+
+    Returns
+    -------
+
+    The ridge readout DataFrame, see eval_ridge.
+    """
+
+    signal, periods, scales, dtype, sig2 = prepare_transform(
+        signal, dt, periods, filter_bank, dtype
+    )
+    Nt = len(signal)
+
+    t_inds = np.arange(Nt)
+    max_power = np.full(Nt, -np.inf)
+    ridge_y = np.zeros(Nt, dtype=int)
+    ridge_z = np.zeros(Nt, dtype=dtype)
+
+    for rows, block in iter_transform(
+        signal, scales, engine, dtype, block_size, filter_bank
+    ):
+        power = np.abs(block) ** 2 / sig2
+        block_y = np.argmax(power, axis=0)
+        block_max = power[block_y, t_inds]
+
+        # strictly larger keeps the first maximum, as np.argmax does
+        better = block_max > max_power
+        max_power[better] = block_max[better]
+        ridge_y[better] = rows[block_y[better]]
+        ridge_z[better] = block[block_y[better], t_inds[better]]
+
+    tvec = t_inds * float(dt)
+    ridge_data = eval_ridge(
+        ridge_y, ridge_z, signal, periods, tvec, power_thresh, smoothing_wsize
+    )
+
+    return ridge_data
+
+
+def wlet_at(
+    signal,
+    dt,
+    periods,
+    y_inds,
+    t_inds=None,
+    engine="direct",
+    filter_bank=None,
+    dtype=complex,
+):
+
+    """
+    Evaluates the complex Wavelet transform of *signal* only
+    at the points (y_inds, t_inds) of the spectrum. Only the 
+    rows for the periods in question get computed, one at a time.
+
+    Parameters
+    ----------
+
+    y_inds : sequence of period indices, e.g. the ridge_y 
+             from get_maxRidge_ys
+
+    t_inds : sequence of time indices with same length as *y_inds*,
+             defaults to all time points 0..len(signal) - 1
+
+    Other parameters are as for compute_spectrum.
+
+    Returns
+    -------
+
+    z : 1d complex ndarray, with the values of the
+        Wavelet transform at the requested points
+    """
+
+    signal, periods, scales, dtype, _ = prepare_transform(
+        signal, dt, periods, filter_bank, dtype
+    )
+
+    y_inds = np.asarray(y_inds)
+    if t_inds is None:
+        t_inds = np.arange(len(signal))
+    t_inds = np.asarray(t_inds)
+
+    z = np.zeros(len(y_inds), dtype=dtype)
+    for rows, block in iter_transform(
+        signal,
+        scales,
+        engine,
+        dtype,
+        block_size=1,
+        filter_bank=filter_bank,
+        scale_inds=np.unique(y_inds),
+    ):
+        pick = y_inds == rows[0]
+        z[pick] = block[0, t_inds[pick]]
+
+    return z
+
+
+def iter_spectrum_chunks(
+    signal, dt, periods, chunk_size=2 ** 16, engine="fft", dtype=complex
+):
+
+    """
+    Generator over the Wavelet spectrum of *signal* in consecutive 
+    time chunks of *chunk_size* samples. Each chunk gets transformed 
+    together with overlaps on both sides covering the longest wavelet, 
+    so the stitched chunks reproduce the spectrum from compute_spectrum 
+    exactly for the 'direct' engine, and within the tolerance of the 
+    'fft' engine (see CWT) otherwise.
+    
+    The overlaps are determined by the wavelet support cut off at 
+    1/peak_fraction of its peak, see clipped_support. For periods 
+    where the support exceeds the signal length, the overlaps 
+    grow to half the signal length.
+
+    *signal* can be a np.memmap, only the chunks plus the 
+    overlaps get loaded into memory.
+
+    Parameters are as for compute_spectrum.
+
+    Yields
+    ------
+
+    (t_slice, modulus, wlet) : the time slice of the current chunk
+                               and the power spectrum and complex 
+                               transform of that chunk
+    """
+
+    Nt = len(signal)
+    periods = np.array(periods)
+    dt = float(dt)
+    check_periods(Nt, dt, periods)
+
+    # global statistics
+    mean = np.mean(signal)
+    sig2 = real_dtype(dtype).type(np.var(signal))
+
+    scales = scales_from_periods(periods, 1 / dt, omega0)
+    Morlet = mk_Morlet(omega0)
+
+    # wavelets are shaped for the full signal
+    kernels = time_kernels(Morlet, scales, Nt)
+    longest = max(len(kernel) for kernel in kernels)
+    overlap = longest // 2 + 1
+
+    if engine == "fft":
+        nfft = next_fast_len(chunk_size + 2 * overlap + longest)
+        _, kernels = fourier_kernels(Morlet, scales, Nt, nfft=nfft)
+        kernels = kernels.astype(dtype, copy=False)
+    elif engine != "direct":
+        raise ValueError(f"Unknown CWT engine '{engine}', use 'direct' or 'fft'")
+
+    for start in range(0, Nt, chunk_size):
+        stop = min(start + chunk_size, Nt)
+
+        # the chunk plus the overlaps
+        left = max(start - overlap, 0)
+        right = min(stop + overlap, Nt)
+        segment = np.asarray(signal[left:right], dtype=float) - mean
+        segment = segment.astype(real_dtype(dtype), copy=False)
+
+        # np.convolve needs the segment to be longer than the wavelet,
+        # zeros beyond the signal end are just the implicit padding
+        if len(segment) < longest:
+            segment = np.pad(segment, (0, longest - len(segment)))
+
+        if engine == "fft":
+            wlet = apply_fourier_kernels(segment, nfft, kernels)
+        else:
+            wlet = apply_time_kernels(segment, kernels, dtype)
+
+        wlet = wlet[:, start - left : stop - left]
+        modulus = np.abs(wlet) ** 2 / sig2
 
-    # --------------------------------------------
-    scales = scales_from_periods(periods, sfreq, omega0)
-    # --------------------------------------------
+        yield slice(start, stop), modulus, wlet
 
-    # mx_per = 4*len(signal)/((omega0+sqrt(2+omega0**2))*sfreq)
-    mx_per = dt * len(signal)
+
+def compute_spectrum_chunked(
+    signal,
+    dt,
+    periods,
+    modulus_out,
+    wlet_out=None,
+    chunk_size=2 ** 16,
+    engine="fft",
+    dtype=complex,
+):
+
+    """
+    Computes the Wavelet spectrum chunk by chunk, see 
+    iter_spectrum_chunks, and writes the results into 
+    *modulus_out* and optionally *wlet_out*, both with 
+    dimensions len(periods) x len(signal). These are best 
+    np.memmap's or file paths (see open_out) for very long recordings.
+
+    Returns
+    -------
+
+    modulus_out, wlet_out
+    """
+
+    shape = (len(periods), len(signal))
+    modulus_out = open_out(modulus_out, shape, real_dtype(dtype))
+    if wlet_out is not None:
+        wlet_out = open_out(wlet_out, shape, dtype)
+
+    for t_slice, modulus, wlet in iter_spectrum_chunks(
+        signal, dt, periods, chunk_size, engine, dtype
+    ):
+        modulus_out[:, t_slice] = modulus
+        if wlet_out is not None:
+            wlet_out[:, t_slice] = wlet
+
+    flush_out(modulus_out, wlet_out)
+    return modulus_out, wlet_out
+
+
+def check_periods(Nt, dt, periods, filter_bank=None):
+
+    """
+    Warns about periods beyond the Nyquist limit or the
+    signal length, and checks a given FilterBank against 
+    the analysis parameters.
+    """
+
+    if periods[0] < 2 * dt:
+        print()
+        print(f"Warning, Nyquist limit is {2*dt:.2f}!!")
+        print()
+
+    mx_per = dt * Nt
     if max(periods) > mx_per:
 
         print()
@@ -84,12 +560,41 @@ def compute_spectrum(signal, dt, periods):
         print("Max. period should be <", np.rint(mx_per))
         print("proceeding anyways...")
 
-    Morlet = mk_Morlet(omega0)
-    wlet = CWT(signal, Morlet, scales)  # complex wavelet transform
-    sig2 = np.var(signal)  # white noise has then mean power of one
-    modulus = np.abs(wlet) ** 2 / sig2  # normalize with variance of signal
+    if filter_bank is not None and not filter_bank.matches(Nt, dt, periods):
+        raise ValueError("FilterBank does not match the analysis parameters!")
+
+
+def prepare_transform(signal, dt, periods, filter_bank=None, dtype=complex):
+
+    """
+    The common preamble of the spectrum functions: subtracts
+    the mean of *signal*, checks the *periods* (see check_periods)
+    and converts them to scales. A given *filter_bank* 
+    overrides *dtype*.
+
+    Returns
+    -------
+
+    signal, periods, scales, dtype, sig2 : the centered signal, the
+                                           periods and scales as arrays,
+                                           the complex dtype and the
+                                           signal variance in its precision
+    """
+
+    # -- subtract the mean --
+    signal = np.array(signal) - np.mean(signal)
+
+    periods = np.array(periods)
+    check_periods(len(signal), dt, periods, filter_bank)
+    scales = scales_from_periods(periods, 1 / dt, omega0)
+
+    if filter_bank is not None:
+        dtype = filter_bank.dtype
+
+    # white noise has then mean power of one
+    sig2 = real_dtype(dtype).type(np.var(signal))
 
-    return modulus, wlet
+    return signal, periods, scales, dtype, sig2
 
 
 def get_maxRidge_ys(modulus):
@@ -118,13 +623,21 @@ def get_maxRidge_ys(modulus):
 
 
 def eval_ridge(
-    ridge_y, wlet, signal, periods, tvec, power_thresh=0, smoothing_wsize=None
+    ridge_y,
+    wlet,
+    signal=None,
+    periods=None,
+    tvec=None,
+    power_thresh=0,
+    smoothing_wsize=None,
 ):
 
     """
     
     Given the ridge y-coordinates, evaluates the spectrum along  
     the time axis return the readout along the ridge.
+    The readout is evaluated in the precision of *wlet*,
+    see also the dtype option of compute_spectrum.
 
     Parameters
     ----------
@@ -133,7 +646,11 @@ def eval_ridge(
                of the spectrum, e.i. the y-coordinates of a ridge
 
     wlet :     2d complex ndarray, holds the complex Wavelet transform 
-               with dimensions len(periods) x len(signal)
+               with dimensions len(periods) x len(signal), 
+               or a 1d complex ndarray holding the transform already 
+               evaluated along the ridge, see wlet_at.
+               Can also be a SpectrumResult, then *signal*, *periods* 
+               and *tvec* are taken from there
 
     signal :   1d ndarray, the original signal to be analyzed, 
                only needed for variance calculation
@@ -166,18 +683,29 @@ def eval_ridge(
 
     """
 
-    sigma2 = np.var(signal)
-    modulus = np.abs(wlet) ** 2 / sigma2  # normalize with variance of signal
+    if isinstance(wlet, SpectrumResult):
+        result = wlet
+        if result.wlet is None:
+            raise ValueError("Need the complex transform for the ridge readout!")
+        signal, periods, tvec = result.signal, result.periods, result.tvec
+        sigma2 = result.variance
+        wlet = result.wlet
+    else:
+        sigma2 = wlet.real.dtype.type(np.var(signal))
 
     # calculate here to minimize arguments needed
     dt = tvec[1] - tvec[0]
 
-    Nt = modulus.shape[1]  # number of time points
+    Nt = wlet.shape[-1]  # number of time points
 
     ridge_per = periods[ridge_y]
-    ridge_z = wlet[ridge_y, np.arange(Nt)]  # picking the right t-y values !
+    if wlet.ndim == 2:
+        ridge_z = wlet[ridge_y, np.arange(Nt)]  # picking the right t-y values !
+    else:
+        ridge_z = wlet
 
-    ridge_power = modulus[ridge_y, np.arange(Nt)]
+    # normalize with variance of signal
+    ridge_power = np.abs(ridge_z) ** 2 / sigma2
 
     inds = (
         ridge_power > power_thresh
@@ -256,13 +784,23 @@ def find_COI_crossing(rd):
 # ============ Snake Annealing =====================================
 
 
-def find_ridge_anneal(landscape, y0, T_ini, Nsteps, mx_jump=2, curve_pen=0):
+def find_ridge_anneal(
+    landscape,
+    y0,
+    T_ini,
+    Nsteps,
+    mx_jump=2,
+    curve_pen=0,
+    patience=None,
+    rng=None,
+    verbose=False,
+):
 
     """ 
     Taking an initial straight line guess at *y0* finds a ridge in *landscape* which 
     minimizes the cost_func_anneal by the simulated annealing method.
 
-    landscape - time x scales signal representation (modulus of Wavelet transform)
+    landscape - scales x time signal representation (modulus of Wavelet transform)
     y0        - initial ridge guess is straight line at scale landscape[y0] 
                 -> best to set it close to a peak in the Wavelet modulus (*landscape*)
     T_ini     - initial value of the temperature for the annealing method
@@ -270,11 +808,24 @@ def find_ridge_anneal(landscape, y0, T_ini, Nsteps, mx_jump=2, curve_pen=0):
     mx_jump   - Max. distance in scale direction covered by the random steps
     curve_pen - Penalty weight for the 2nd derivative of the ridge to estimate -> 
                 high values lead to  less curvy ridges
+    patience  - stop early after that many consecutive rejected moves,
+                None runs all *Nsteps*
+    rng       - optional numpy.random.Generator, if None the 
+                global numpy random state is used
+    verbose   - print start, end and final statistics
+
+    Each step only evaluates the cost change of the moved ridge point,
+    so a step costs O(1) independent of the ridge length. The final
+    cost is the initial cost plus the accepted changes.
 
+    Returns the ridge y-coordinates and the final cost.
     """
 
-    print()
-    print("started annealing..")
+    if verbose:
+        print()
+        print("started annealing..")
+
+    landscape = np.asarray(landscape)
 
     incr = np.arange(-mx_jump, mx_jump + 1)  # possible jumps in scale direction
     incr = incr[incr != 0]  # remove middle zero
@@ -286,202 +837,686 @@ def find_ridge_anneal(landscape, y0, T_ini, Nsteps, mx_jump=2, curve_pen=0):
         Nt, dtype=int
     )  # initial ridge guess is straight line at scale landscape[y0]
 
-    Nrej = 0
-
     tfac = 0.01  # still arbitrary :/
     T_ini = T_ini * tfac
     curve_pen = curve_pen * tfac
 
-    T_k = T_ini  # for more natural units ->  0 < T_ini < 100 should be ok
+    # draw all random numbers at once
+    if rng is None:
+        positions = randint(0, Nt, size=Nsteps)
+        jumps = choice(incr, size=Nsteps)
+        us = uniform(size=Nsteps)
+    else:
+        positions = rng.integers(0, Nt, size=Nsteps)
+        jumps = rng.choice(incr, size=Nsteps)
+        us = rng.random(Nsteps)
+
+    # for more natural units ->  0 < T_ini < 100 should be ok
+    temperatures = T_ini / np.log(2 + np.arange(Nsteps))
+
+    def local_cost(pos, y):
+
+        # the terms of the total cost involving ridge point *pos*
+        cost = -landscape[y, pos]
+        for j in range(max(pos - 1, 1), min(pos + 2, Nt - 1)):
+            # 2nd difference centered at j
+            y_left = y if j - 1 == pos else ys[j - 1]
+            y_mid = y if j == pos else ys[j]
+            y_right = y if j + 1 == pos else ys[j + 1]
+            cost += curve_pen * abs(y_right - 2 * y_mid + y_left)
+        return cost
+
+    F = cost_func_anneal(ys, t_inds, landscape, 0, curve_pen)
+    Nrej = 0
+    k = 0
 
     for k in range(Nsteps):
 
-        F = cost_func_anneal(ys, t_inds, landscape, 0, curve_pen)
-
-        pos = randint(
-            0, len(ys), size=1
-        )  # choose time position to make random scale jump
+        pos = positions[k]  # time position to make random scale jump
+        y = ys[pos]
 
         # dealing with the scale domain boundaries
-        if ys[pos] >= Ns - mx_jump - 1:
+        if y >= Ns - mx_jump - 1:
             eps = -1
 
-        elif ys[pos] < mx_jump:
+        elif y < mx_jump:
             eps = +1
 
         # jump!
         else:
-            eps = choice(incr, size=1)
+            eps = jumps[k]
 
-        ys[pos] = ys[pos] + eps  # the candidate
+        # cost change of the candidate
+        dF = (local_cost(pos, y + eps) - local_cost(pos, y)) / Nt
 
-        F_c = cost_func_anneal(ys, t_inds, landscape, 0, curve_pen)
+        # reject bad move? exp(-dF/T_k) is (Boltzmann) probability
+        # for bad move to be accepted
+        if dF > 0 and us[k] > np.exp(-dF / temperatures[k]):
+            Nrej += 1
+            if patience is not None and Nrej >= patience:
+                break
+            continue
 
-        accept = True
+        ys[pos] = y + eps
+        F += dF
+        Nrej = 0
 
-        # a locally non-optimal move occured
-        if F_c > F:
-            u = uniform()
+    if verbose:
+        print()
+        print("annealing done!")
+        print("steps:", k + 1)
+        print("final cost:", F)
+        print("number of final still steps:", Nrej)
+        print("final temperature:", temperatures[k] / tfac)
 
-            # reject bad move? exp(-(F_c - F)/T_k) is (Boltzmann) probability for bad move to be accepted
-            if u > np.exp(-(F_c - F) / T_k):
-                accept = False
+    return ys, F
 
-        if not accept:
-            ys[pos] = ys[pos] - eps  # revert the wiggle
-            Nrej += 1
 
-        if accept:
-            Nrej = 0
+def _anneal_restart(seed_seq, landscape, y0, T_ini, Nsteps, **kwargs):
 
-        print(T_k)
-        T_k = T_ini / np.log(2 + k)  # update temperature
+    """ One annealing run with its own random stream, worker entry point """
 
-    print()
-    print("annealing done!")
-    print("final cost:", F_c)
-    print("number of final still steps:", Nrej)
-    print("final temperature:", T_k * tfac)
-    return ys, F_c
+    rng = np.random.default_rng(seed_seq)
+    return find_ridge_anneal(landscape, y0, T_ini, Nsteps, rng=rng, **kwargs)
 
 
-def cost_func_anneal(ys, t_inds, landscape, l, m):
+def find_ridge_anneal_restarts(
+    landscape,
+    y0,
+    T_ini,
+    Nsteps,
+    restarts=4,
+    n_workers=None,
+    seed=None,
+    **kwargs,
+):
 
     """
-    Evaluates ridge candidate *ys* on *landscape* plus penalizing terms
-    for 1st (*l*) and 2nd (*m*) derivative of the ridge curve.
-    """
+    Runs *restarts* independent annealings, see find_ridge_anneal, 
+    in parallel processes and returns the ridge with the lowest cost.
+    Every run draws from its own random stream spawned from *seed*, 
+    so the result is reproducible. Further keyword arguments 
+    (mx_jump, curve_pen, patience) are passed on.
 
-    N = len(ys)
-    D = -sum(landscape[ys, t_inds])
-    S1 = l * sum(abs(np.diff(ys, 1)))
-    S2 = m * sum(abs(np.diff(ys, 2)))
+    n_workers : number of processes, None uses all cores,
+                1 runs all restarts in the calling process
 
-    # print D,S1,S2,D + S1 + S2
+    Returns the best ridge y-coordinates and its cost.
+    """
 
-    return (D + S1 + S2) / N
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    seeds = seed.spawn(restarts)
+
+    worker = partial(
+        _anneal_restart,
+        landscape=np.asarray(landscape),
+        y0=y0,
+        T_ini=T_ini,
+        Nsteps=Nsteps,
+        **kwargs,
+    )
 
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    n_workers = max(1, min(n_workers, restarts))
 
-# =============== Filters +  Detrending =================================
+    if n_workers == 1:
+        results = list(map(worker, seeds))
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            results = list(pool.map(worker, seeds))
 
+    return min(results, key=lambda res: res[1])
 
-def smooth(x, window_len=11, window="flat", data=None):
-    """
-    smooth the data using a window with requested size.
 
-    input:
-    x: the input signal
-    window_len: the dimension of the smoothing window; should be an odd integer
-    window: the type of window from 'flat' or 'extern'
+def find_ridge_dp(landscape, max_jump=3, curve_pen=0):
 
-    flat window will produce a moving average smoothing.
-    data: if not None, will be used as evaluated window!
+    """
+    Finds the ridge in *landscape* which exactly minimizes
+    the cost_func_anneal by dynamic programming (Viterbi). 
+    The ridge can jump at most *max_jump* scales between 
+    consecutive time points, up to dp_max_jump. *curve_pen* 
+    penalizes the 2nd derivative of the ridge as for 
+    find_ridge_anneal. 
+
+    Runs in a single pass over time, the work is
+    O(Nt * Nscales * (2 * max_jump + 1)**2).
+
+    landscape - scales x time signal representation (modulus of Wavelet transform)
+    max_jump  - Max. distance in scale direction between consecutive time points
+    curve_pen - Penalty weight for the 2nd derivative of the ridge -> 
+                high values lead to  less curvy ridges
 
+    Returns the ridge y-coordinates and the cost of the ridge.
     """
 
-    x = np.array(x)
+    landscape = np.asarray(landscape, dtype=float)
+    Ns, Nt = landscape.shape
 
-    # use externally derieved window evaluation
-    if data is not None:
-        window_len = len(data)
-        window = "extern"
+    check_max_jump(max_jump)
+    ys = _ridge_dp(landscape, np.zeros(Nt, dtype=int), max_jump, curve_pen)
+    F = cost_func_anneal(ys, np.arange(Nt), landscape, 0, curve_pen * 0.01)
 
-    if x.size < window_len:
-        raise ValueError("Input vector needs to be bigger than window size.")
+    return ys, F
 
-    if window_len < 3:
-        raise ValueError("window must not be shorter than 3")
 
-    if window_len % 2 is 0:
-        raise ValueError("window_len should be odd")
+def check_max_jump(max_jump):
 
-    if not window in ["flat", "extern"]:
-        raise ValueError("Window is none of 'flat' or 'extern'")
+    """ The DP ridge allows jumps of 1 up to dp_max_jump scales """
 
-    s = np.r_[x[window_len - 1 : 0 : -1], x, x[-1:-window_len:-1]]
-    # print(len(s))
-    if window == "flat":  # moving average
-        w = np.ones(window_len, "d")
+    if not 1 <= int(max_jump) <= dp_max_jump:
+        raise ValueError(f"max_jump must be between 1 and {dp_max_jump}!")
 
-    elif window == "extern":
-        w = data
 
-    else:
-        w = eval(window + "(window_len)")
+def _ridge_dp(band, lower, max_jump, curve_pen):
 
-    y = np.convolve(w / w.sum(), s, mode="valid")
+    """
+    The dynamic programming of find_ridge_dp restricted to a band,
+    row i of *band* at time t is the scale lower[t] + i.
+    Returns the ridge y-coordinates in full scale coordinates.
+    """
 
-    return y[int((window_len - 1) / 2) : len(y) - int((window_len - 1) / 2)]
+    W, Nt = band.shape
 
+    max_jump = int(max_jump)
+    jumps = np.arange(-max_jump, max_jump + 1)
+    Nj = len(jumps)
 
-def sinc_filter(M, f_c=0.2):
+    # same units as for the annealing
+    tfac = 0.01
+    curve_pen = curve_pen * tfac
 
-    """ 
-    Cutoff frequency f_c in sampling frequency unit, max 0.5!
-    M is blackman window length and must be even, output length will be M+1.
+    # 2nd derivative penalty between consecutive jumps
+    jump_pen = curve_pen * np.abs(jumps[:, None] - jumps[None, :])
 
-    """
+    # the states are (scale, last jump), no penalty for
+    # the first jump as there is no 2nd derivative yet
+    cost = np.repeat(-band[:, :1], Nj, axis=1)
 
-    # not very effective, but should be get called only once per convolution
+    # best previous jump for each state
+    back = np.zeros((Nt, W, Nj), dtype=np.int16)
 
-    assert M % 2 == 0, "M must be even!"
-    res = []
+    for t in range(1, Nt):
 
-    for x in np.arange(0, M + 1):
+        # best previous jump for every (previous scale, jump)
+        total = cost[:, None, :] + jump_pen[None, :, :]
+        best = total.argmin(axis=2)
+        best_cost = np.take_along_axis(total, best[..., None], axis=2)[..., 0]
 
-        if x == M / 2:
-            res.append(2 * pi * f_c)
-            continue
+        # shift by the jump: from scale y - jump to y,
+        # minus the shift of the band itself
+        new_cost = np.full((W, Nj), np.inf)
+        for k, jump in enumerate(jumps):
+            shift = jump - (lower[t] - lower[t - 1])
+            lo, hi = max(0, -shift), min(W, W - shift)
+            if lo >= hi:
+                continue
+            new_cost[lo + shift : hi + shift, k] = best_cost[lo:hi, k]
+            back[t, lo + shift : hi + shift, k] = best[lo:hi, k]
 
-        r = np.sin(2 * pi * f_c * (x - M / 2)) / (
-            x - M / 2
-        )  # the sinc filter unwindowed
-        r = r * (
-            0.42 - 0.5 * np.cos(2 * pi * x / M) + 0.08 * np.cos(4 * pi * x / M)
-        )  # blackman window
-        res.append(r)
+        cost = new_cost - band[:, t : t + 1]
 
-    res = np.array(res)
-    res = res / np.sum(res)
+    # backtracking from the optimal end state
+    i, k = np.unravel_index(np.argmin(cost), cost.shape)
+    ys = np.zeros(Nt, dtype=int)
+    ys[-1] = y = lower[-1] + i
+    for t in range(Nt - 1, 0, -1):
+        y, k = y - jumps[k], back[t, y - lower[t], k]
+        ys[t - 1] = y
 
-    return res
+    return ys
 
 
-def sinc_smooth(raw_signal, T_c, dt, M=None):
+def block_reduce(landscape, sub_s, sub_t):
 
     """
-    Convolve the signal with a sinc filter
-    of cut-off period *T_c*.
-
-    Length of the filter controlled by
-    M, defaults to length of the raw_signal
+    Mean of *landscape* over blocks of *sub_s* scales times 
+    *sub_t* time points, incomplete blocks at the 
+    end are averaged over their actual size.
     """
 
-    signal = np.array(raw_signal)
-    dt = float(dt)
+    landscape = np.asarray(landscape, dtype=float)
+    Ns, Nt = landscape.shape
 
-    # relative cut_off frequency
-    f_c = dt / T_c
+    s_starts = np.arange(0, Ns, sub_s)
+    t_starts = np.arange(0, Nt, sub_t)
 
-    if M is None:
+    sums = np.add.reduceat(landscape, s_starts, axis=0)
+    sums = np.add.reduceat(sums, t_starts, axis=1)
+    counts = np.outer(np.diff(s_starts, append=Ns), np.diff(t_starts, append=Nt))
 
-        M = len(signal) - 1  # max for sharp roll-off
+    return sums / counts
 
-        # M needs to be even
-        if M % 2 != 0:
-            M = M - 1
 
-    w = sinc_filter(M, f_c)  # the evaluated windowed sinc filter
-    sinc_smoothed = smooth(signal, data=w)
+def find_ridge_coarse_to_fine(
+    landscape,
+    sub_s=2,
+    sub_t=2,
+    max_jump=3,
+    curve_pen=0,
+    method="dp",
+    band=None,
+    y0=None,
+    T_ini=0.2,
+    Nsteps=25000,
+    **anneal_kwargs,
+):
+
+    """
+    Multiresolution ridge search, the ridge first gets found on 
+    the *landscape* block-reduced by *sub_s* scales times *sub_t*
+    time points, see block_reduce. The upsampled coarse ridge
+    then gets refined by dynamic programming at full resolution
+    within a band of +-*band* scales around it. 
+
+    Only the coarse search gets cheaper, by a factor of about 
+    sub_s * sub_t. The refinement still passes over every time 
+    point, its work per time point only scales with the band 
+    width instead of the number of scales.
+
+    landscape - scales x time signal representation (modulus of Wavelet transform)
+    sub_s     - subsampling factor in scale direction
+    sub_t     - subsampling factor in time direction
+    max_jump  - Max. distance in scale direction between consecutive 
+                time points at full resolution
+    curve_pen - Penalty weight for the 2nd derivative of the ridge, 
+                on the coarse grid it applies to coarse units
+    method    - 'dp' or 'anneal', the search on the coarse grid, 
+                see find_ridge_dp and find_ridge_anneal
+    band      - half width of the refinement band in scales, 
+                defaults to sub_s + max_jump
+    y0        - scale index of the initial straight line ridge for 
+                the annealing, defaults to the maximum of the 
+                time averaged *landscape*
+    T_ini, Nsteps, anneal_kwargs - passed on to find_ridge_anneal 
+                                   for the coarse annealing
+
+    Returns the ridge y-coordinates and the cost of the ridge.
+    """
+
+    landscape = np.asarray(landscape, dtype=float)
+    Ns, Nt = landscape.shape
+    check_max_jump(max_jump)
+
+    coarse = block_reduce(landscape, sub_s, sub_t)
+
+    # the maximal full resolution slope in coarse units
+    coarse_jump = max(1, int(np.ceil(max_jump * sub_t / sub_s)))
+    coarse_jump = min(coarse_jump, dp_max_jump)
+
+    if method == "dp":
+        coarse_ys, _ = find_ridge_dp(coarse, coarse_jump, curve_pen)
+
+    elif method == "anneal":
+        if y0 is None:
+            y0 = int(np.argmax(landscape.mean(axis=1)))
+        coarse_ys, _ = find_ridge_anneal(
+            coarse,
+            y0 // sub_s,
+            T_ini,
+            Nsteps,
+            mx_jump=coarse_jump,
+            curve_pen=curve_pen,
+            **anneal_kwargs,
+        )
+
+    else:
+        raise ValueError(f"Unknown method '{method}', use 'dp' or 'anneal'")
+
+    # upsample, linear between the block centers
+    t_centers = np.arange(len(coarse_ys)) * sub_t + (sub_t - 1) / 2
+    s_centers = coarse_ys * sub_s + (sub_s - 1) / 2
+    ys_up = np.interp(np.arange(Nt), t_centers, s_centers)
+
+    if band is None:
+        band = sub_s + max_jump
+    W = min(2 * int(band) + 1, Ns)
+
+    # the band must not move faster than the ridge can follow
+    lower = slope_limited(np.rint(ys_up).astype(int) - int(band), max_jump)
+    lower = np.clip(lower, 0, Ns - W)
+    band_landscape = landscape[lower[None, :] + np.arange(W)[:, None], np.arange(Nt)]
+
+    ys = _ridge_dp(band_landscape, lower, max_jump, curve_pen)
+    F = cost_func_anneal(ys, np.arange(Nt), landscape, 0, curve_pen * 0.01)
+
+    return ys, F
+
+
+def slope_limited(ys, max_jump):
+
+    """
+    Integer curve closest to *ys* which changes by at most 
+    *max_jump* between consecutive points, the midpoint of
+    the largest such curve below and the smallest above *ys*.
+    A curve which already keeps the slope stays unchanged.
+    """
+
+    ts = max_jump * np.arange(len(ys))
+
+    # min_s ys_s + max_jump * |t - s| and the max analogue,
+    # as running extrema from both sides
+    below = np.minimum(
+        ts + np.minimum.accumulate(ys - ts),
+        np.minimum.accumulate((ys + ts)[::-1])[::-1] - ts,
+    )
+    above = np.maximum(
+        np.maximum.accumulate(ys + ts) - ts,
+        ts + np.maximum.accumulate((ys - ts)[::-1])[::-1],
+    )
+
+    return (below + above) // 2
+
+
+def cost_func_anneal(ys, t_inds, landscape, l, m):
+
+    """
+    Evaluates ridge candidate *ys* on *landscape* plus penalizing terms
+    for 1st (*l*) and 2nd (*m*) derivative of the ridge curve.
+    """
+
+    N = len(ys)
+    D = -sum(landscape[ys, t_inds])
+    S1 = l * sum(abs(np.diff(ys, 1)))
+    S2 = m * sum(abs(np.diff(ys, 2)))
+
+    # print D,S1,S2,D + S1 + S2
+
+    return (D + S1 + S2) / N
+
+
+# =============== Filters +  Detrending =================================
+
+
+def smooth(x, window_len=11, window="flat", data=None, method="auto"):
+    """
+    smooth the data using a window with requested size.
+
+    input:
+    x: the input signal
+    window_len: the dimension of the smoothing window; should be an odd integer
+    window: the type of window from 'flat' or 'extern'
+
+    flat window will produce a moving average smoothing.
+    data: if not None, will be used as evaluated window!
+    method: 'direct' or 'fft' convolution, 'auto' takes 'fft' 
+            if signal length times window length exceeds 
+            the global fft_smooth_threshold
+
+    """
+
+    x = np.array(x)
+
+    # use externally derieved window evaluation
+    if data is not None:
+        window_len = len(data)
+        window = "extern"
+
+    if x.size < window_len:
+        raise ValueError("Input vector needs to be bigger than window size.")
+
+    if window_len < 3:
+        raise ValueError("window must not be shorter than 3")
+
+    if window_len % 2 == 0:
+        raise ValueError("window_len should be odd")
+
+    if not window in ["flat", "extern"]:
+        raise ValueError("Window is none of 'flat' or 'extern'")
+
+    if method == "auto":
+        method = "fft" if x.size * window_len > fft_smooth_threshold else "direct"
+    elif method not in ("direct", "fft"):
+        raise ValueError(f"Unknown method '{method}', use 'auto', 'direct' or 'fft'")
+
+    s = np.r_[x[window_len - 1 : 0 : -1], x, x[-1:-window_len:-1]]
+    # print(len(s))
+    if window == "flat":  # moving average
+        w = np.ones(window_len, "d")
+
+    elif window == "extern":
+        w = data
+
+    else:
+        w = eval(window + "(window_len)")
+
+    # same reflective boundaries for both methods
+    if method == "fft":
+        y = fftconvolve(w / w.sum(), s, mode="valid")
+    else:
+        y = np.convolve(w / w.sum(), s, mode="valid")
+
+    return y[int((window_len - 1) / 2) : len(y) - int((window_len - 1) / 2)]
+
+
+def sinc_filter(M, f_c=0.2):
+
+    """ 
+    Cutoff frequency f_c in sampling frequency unit, max 0.5!
+    M is blackman window length and must be even, output length will be M+1.
+
+    """
+
+    assert M % 2 == 0, "M must be even!"
+
+    key = ("sinc", M, f_c)
+    res = kernel_cache.get(key)
+    if res is not None:
+        return res
+
+    x = np.arange(0, M + 1)
+    n = x - M / 2
+    center = n == 0
+
+    # the sinc filter unwindowed, 2 pi f_c at the center
+    res = np.empty(M + 1)
+    res[~center] = np.sin(2 * pi * f_c * n[~center]) / n[~center]
+    res[center] = 2 * pi * f_c
+
+    # blackman window, it is one at the center, which stays as is
+    window = 0.42 - 0.5 * np.cos(2 * pi * x / M) + 0.08 * np.cos(4 * pi * x / M)
+    res[~center] *= window[~center]
+
+    res = res / np.sum(res)
+
+    return kernel_cache.put(key, res)
+
+
+def sinc_filter_error(M, f_c, transition=0.2):
+
+    """
+    Maximal deviation of the frequency response of the 
+    sinc_filter(M, f_c) from the ideal low-pass, 1 in the
+    passband f < f_c * (1 - transition) and 0 in the stopband 
+    f > f_c * (1 + transition), frequencies in sampling 
+    frequency units.
+    """
+
+    w = sinc_filter(M, f_c)
+
+    # fine frequency grid
+    nfft = next_fast_len(max(8 * len(w), 2 ** 14))
+    response = np.abs(np.fft.rfft(w, n=nfft))
+    freqs = np.fft.rfftfreq(nfft)
+
+    passband = freqs < f_c * (1 - transition)
+    stopband = freqs > f_c * (1 + transition)
+
+    error = max(
+        np.abs(response[passband] - 1).max(initial=0),
+        response[stopband].max(initial=0),
+    )
+
+    return error
+
+
+def auto_sinc_M(T_c, dt, N, tol=1e-2, transition=0.2):
+
+    """
+    Smallest even filter length M for the sinc detrending with 
+    cut-off period *T_c*, such that the frequency response stays 
+    within *tol* of the ideal low-pass outside the transition 
+    band around T_c, see sinc_filter_error. 
+
+    Parameters
+    ----------
+
+    T_c : the cut-off period
+
+    dt  : the sampling interval, same units as T_c
+
+    N   : the signal length, M is at most the default N - 1
+
+    tol : the tolerated deviation in the pass- and stopband
+
+    transition : relative width of the transition band 
+                 on the frequency axis
+
+    Returns
+    -------
+
+    M     : the even filter length
+
+    error : the achieved error, can exceed *tol* 
+            if even the maximal M is not sufficient
+    """
+
+    f_c = float(dt) / T_c
+
+    M_max = N - 1
+    if M_max % 2 != 0:
+        M_max = M_max - 1
+
+    error = sinc_filter_error(M_max, f_c, transition)
+    if error > tol:
+        print(f"Warning, sinc filter error {error:.2e} exceeds the tolerance!")
+        return M_max, error
+
+    # the error decreases with the filter length,
+    # bisect over the even lengths
+    lower, upper = 1, M_max // 2
+    while lower < upper:
+        mid = (lower + upper) // 2
+        if sinc_filter_error(2 * mid, f_c, transition) <= tol:
+            upper = mid
+        else:
+            lower = mid + 1
+
+    M = 2 * upper
+    return M, sinc_filter_error(M, f_c, transition)
+
+
+def sinc_smooth(raw_signal, T_c, dt, M=None, method="auto"):
+
+    """
+    Convolve the signal with a sinc filter
+    of cut-off period *T_c*.
+
+    Length of the filter controlled by
+    M, defaults to length of the raw_signal.
+    M='auto' chooses the shortest filter within 
+    the default tolerance, see auto_sinc_M.
+
+    The convolution *method* is passed on to smooth,
+    long signals get convolved via FFT.
+    """
+
+    signal = np.array(raw_signal)
+    dt = float(dt)
+
+    # relative cut_off frequency
+    f_c = dt / T_c
+
+    if M is None:
+
+        M = len(signal) - 1  # max for sharp roll-off
+
+        # M needs to be even
+        if M % 2 != 0:
+            M = M - 1
+
+    elif M == "auto":
+        M, _ = auto_sinc_M(T_c, dt, len(signal))
+
+    w = sinc_filter(M, f_c)  # the evaluated windowed sinc filter
+    sinc_smoothed = smooth(signal, data=w, method=method)
 
     return sinc_smoothed
 
 
+def sinc_detrend_frame(df, T_c, dt, M=None):
+
+    """
+    Sinc detrending of all signals (columns) of the DataFrame *df*
+    with cut-off period *T_c*, see sinc_smooth. 
+
+    NaNs get skipped as for single signals, columns with the same 
+    number of valid samples share the filter and get detrended 
+    together by one batched FFT convolution.
+
+    Returns a DataFrame of the detrended signals, NaNs stay in place.
+    """
+
+    dt = float(dt)
+    f_c = dt / T_c
+
+    def detrend(signals):
+
+        Nt = signals.shape[1]
+        if M is None:
+            Mg = Nt - 1  # max for sharp roll-off
+            Mg = Mg - 1 if Mg % 2 != 0 else Mg
+        elif M == "auto":
+            Mg, _ = auto_sinc_M(T_c, dt, Nt)
+        else:
+            Mg = M
+
+        w = sinc_filter(Mg, f_c)
+        window_len = len(w)
+
+        if Nt < window_len:
+            raise ValueError("Input vector needs to be bigger than window size.")
+
+        # same reflective boundaries as in smooth
+        padded = np.concatenate(
+            [
+                signals[:, window_len - 1 : 0 : -1],
+                signals,
+                signals[:, -1:-window_len:-1],
+            ],
+            axis=1,
+        )
+        trends = fftconvolve(padded, w[None, :] / w.sum(), mode="valid", axes=1)
+        half = (window_len - 1) // 2
+        trends = trends[:, half : trends.shape[1] - half]
+
+        return signals - trends
+
+    detrended = apply_valid_rows(detrend, df.to_numpy(dtype=float).T)
+
+    return pd.DataFrame(detrended.T, index=df.index, columns=df.columns)
+
+
+def normalize_frame(df, L, dt):
+
+    """
+    Amplitude normalization of all signals (columns) of the
+    DataFrame *df* with window size *L* in one call,
+    see normalize_with_envelope. NaNs stay in place.
+    """
+
+    normalized = normalize_with_envelope(df.to_numpy(dtype=float).T, L, dt)
+
+    return pd.DataFrame(normalized.T, index=df.index, columns=df.columns)
+
+
 def sliding_window_amplitude(signal, window_size, dt, SGsmooth=True):
 
     """
     Max - Min sliding window operation
-    to estimate amplitude envelope.
+    to estimate amplitude envelope, 
+    runs in linear time independent of the window size.
 
     free boundaries -> half the window_size + 1
     at 1st and last entry
@@ -493,13 +1528,15 @@ def sliding_window_amplitude(signal, window_size, dt, SGsmooth=True):
     Parameters
     ----------
 
-    signal : ndarray, the (detrended) signal
+    signal : ndarray, the (detrended) signal, or a 2d array 
+             with one signal per row. NaNs of a row get skipped,
+             the envelope is NaN there.
     window_size : int, the window size in time units
     dt : float, the sampling interval 
     """
 
     # get the underlying array
-    vector = np.array(signal)
+    vector = np.array(signal, dtype=float)
 
     # window size in sampling interval units
     window_size = int(window_size / dt)
@@ -508,30 +1545,28 @@ def sliding_window_amplitude(signal, window_size, dt, SGsmooth=True):
     if window_size % 2 != 1:
         window_size = window_size + 1
 
-    # rolling matrix
-    # Stack Overflow move
-    shape = vector.shape[:-1] + (vector.shape[-1] - window_size + 1, window_size)
-    strides = vector.strides + (vector.strides[-1],)
-    aa = np.lib.stride_tricks.as_strided(vector, shape=shape, strides=strides)
+    def envelope(signals):
 
-    # treat the boundaries, fill with NaNs
-    b_size = window_size // 2
-    b_left = np.zeros((b_size, aa.shape[1]), dtype=float) * np.nan
-    b_right = np.zeros((b_size, aa.shape[1]), dtype=float) * np.nan
+        # running max and min, at the boundaries the window shrinks
+        # to the available samples, edge padding ('nearest')
+        # does not change the extrema
+        rmax = maximum_filter1d(signals, size=window_size, mode="nearest", axis=-1)
+        rmin = minimum_filter1d(signals, size=window_size, mode="nearest", axis=-1)
 
-    for i in range(b_size):
-        b_left[i, : b_size + i + 1] = vector[: b_size + 1 + i]
-        b_right[-(i + 1), -(b_size + 1 + i) :] = vector[-(b_size + 1 + i) :]
+        # max-min/2 in sliding window
+        amplitudes = (rmax - rmin) / 2
 
-    rm = np.vstack([b_left, aa, b_right])
+        if SGsmooth:
+            amplitudes = savgol_filter(
+                amplitudes, window_length=window_size, polyorder=3, axis=-1
+            )
 
-    # max-min/2 in sliding window
-    amplitudes = (np.nanmax(rm, axis=1) - np.nanmin(rm, axis=1)) / 2
+        return amplitudes
 
-    if SGsmooth:
-        amplitudes = savgol_filter(amplitudes, window_length=window_size, polyorder=3)
+    if vector.ndim == 2:
+        return apply_valid_rows(envelope, vector)
 
-    return amplitudes
+    return envelope(vector)
 
 
 def normalize_with_envelope(dsignal, window_size, dt):
@@ -541,24 +1576,38 @@ def normalize_with_envelope(dsignal, window_size, dt):
 
     Mean subtraction is still always performed.
 
-    Does NOT check for zero-divide errors,
-    arrising in cases where the signal is constant.
+    Where the envelope vanishes, e.g. for constant
+    stretches, the normalized signal is set to 0.
 
     Parameters
     ----------
 
-    dsignal : ndarray, the (detrended) signal
+    dsignal : ndarray, the (detrended) signal, or a 2d array 
+              with one signal per row, NaNs stay in place
     window_size : int, the window size in time units
     dt : float, the sampling interval 
     """
 
-    # mean subtraction
-    signal = dsignal - dsignal.mean()
+    dsignal = np.array(dsignal, dtype=float)
+
+    # mean subtraction, all NaN rows stay NaN
+    valid = ~np.isnan(dsignal)
+    mean = np.nansum(dsignal, axis=-1, keepdims=True) / np.maximum(
+        valid.sum(axis=-1, keepdims=True), 1
+    )
+    signal = dsignal - mean
 
-    
     # ampl. normalization
     env = sliding_window_amplitude(signal, window_size, dt)
-    ANsignal = 1 / env * dsignal
+
+    # guard against zero division
+    zero = env == 0
+    if np.any(zero):
+        print("Warning, amplitude envelope vanishes, setting signal to 0 there!")
+
+    ANsignal = np.divide(dsignal, env, out=np.zeros_like(dsignal), where=~zero)
+    # keep the NaNs of the input
+    ANsignal[np.isnan(env)] = np.nan
 
     return ANsignal
 
@@ -590,9 +1639,28 @@ def mk_Morlet(omega0):
         )
         return 1 / np.sqrt(scale) * res
 
+    # needed by the FFT engine of the CWT
+    Morlet.fourier = mk_Morlet_fourier(omega0)
+    # to identify cached wavelets
+    Morlet.cache_key = ("Morlet", omega0)
+
     return Morlet
 
 
+def mk_Morlet_fourier(omega0):
+
+    """
+    The analytic (continuous) Fourier transform
+    of the unit energy Morlet from mk_Morlet
+    """
+
+    def Morlet_fourier(omega, scale):
+        res = pi ** (-0.25) * np.sqrt(2 * pi) * np.exp(-0.5 * (scale * omega - omega0) ** 2)
+        return np.sqrt(scale) * res
+
+    return Morlet_fourier
+
+
 def gauss_envelope(t, scale):
 
     """
@@ -613,82 +1681,1101 @@ def inverse_gauss(y, scale):
     return scale * np.sqrt(-2 * np.log(y / a))
 
 
-# allows for complex wavelets, needs scales scaled with sampling freq!
-def CWT(signal, wavelet, scales, clip_support=clip_support):
+def clipped_support(scale, fraction=None):
 
-    # test for complexity
-    if np.iscomplexobj(wavelet(10, 1)):
-        output = np.zeros([len(scales), len(signal)], dtype=complex)
-    else:
-        output = np.zeros([len(scales), len(signal)])
+    """
+    Half width of the Morlet support cut off
+    at 1/fraction of the Morlet peak, 
+    *fraction* defaults to the global peak_fraction.
+    """
 
-    # we want to take always the maximum support available
-    # .. no we don't -> performance, otherwise convolutions scale with N * N!!
-    # vec = np.arange(-len(signal)/2, len(signal)/2) # old default
+    if fraction is None:
+        fraction = peak_fraction
 
-    for ind, scale in enumerate(scales):
+    # Morlet main peak value:
+    y0 = gauss_envelope(0, scale)
 
-        # Morlet main peak value:
-        y0 = gauss_envelope(0, scale)
+    return int(inverse_gauss(y0 / fraction, scale))
 
-        if clip_support:
-            # support cut off at 1/peak_fraction of Morlet peak
-            x_max = int(inverse_gauss(y0 / peak_fraction, scale))
-        else:
-            x_max = len(signal) / 2
 
-        # print(ind, scale, 2*x_max)
+def support_vector(scale, Nt, clip_support=clip_support, fraction=None):
 
-        # max support is length of signal
-        if 2 * x_max > len(signal):
-            vec = np.arange(-len(signal) / 2, len(signal) / 2)
+    """
+    The sample positions the wavelet at *scale*
+    gets evaluated on for the convolution with a
+    signal of length *Nt*.
+    """
 
-        else:
-            vec = np.arange(-x_max, x_max)
+    if clip_support:
+        x_max = clipped_support(scale, fraction)
+    else:
+        x_max = Nt / 2
 
-        wavelet_data = wavelet(vec, scale)
-        output[ind, :] = np.convolve(signal, wavelet_data, mode="same")
-    return output
+    # max support is length of signal
+    if 2 * x_max > Nt:
+        vec = np.arange(-Nt / 2, Nt / 2)
 
+    else:
+        vec = np.arange(-x_max, x_max)
 
-def Morlet_COI(omega0=omega0):
-    # slope of Morlet e-folding time in tau-periods (spectral) view
-    m = 4 * pi / (np.sqrt(2) * (omega0 + np.sqrt(2 + omega0 ** 2)))
-    return m
+    return vec
 
 
-def power_to_amplitude(periods, powers, signal_std, dt):
+# allows for complex wavelets, needs scales scaled with sampling freq!
+def CWT(
+    signal,
+    wavelet,
+    scales,
+    clip_support=clip_support,
+    engine="direct",
+    dtype=complex,
+    n_workers=None,
+):
 
     """
-    Rescale Morlet wavelet powers according to the
-    definition of 
+    Continuous Wavelet Transform by convolution,
+    returns a len(scales) x len(signal) array.
+
+    engine : 'direct' - time domain convolution per scale, 
+                        cost grows with the support of each wavelet
+             'fft'    - one transform of the signal, multiplication 
+                        with the wavelets in the frequency domain and 
+                        batched inverse transforms over blocks of scales.
+                        Needs a *wavelet* with a *fourier* attribute, 
+                        see mk_Morlet. 
+             'multirate' - large scales get computed on octave-wise 
+                        decimated signals, see multirate_row. Agrees
+                        with 'direct' to ~1e-5 of the maximal coefficient.
+
+    Both engines agree up to the support clipping of the
+    'direct' engine, so relative deviations are of the order of
+    1/peak_fraction (~1e-6) of the maximal wavelet coefficient.
+
+    dtype : the complex output dtype, np.complex64 computes 
+            and stores in single precision
+
+    n_workers : number of threads sharing the scales, 
+                -1 uses all cores, see parallel_transform
+    """
 
-    "On the Analytic Wavelet Transform",
-    Jonathan M. Lilly 2010
+    signal = np.asarray(signal).astype(real_dtype(dtype))
+
+    if n_threads(n_workers) > 1:
+        if engine not in ("direct", "fft", "multirate"):
+            raise ValueError(
+                f"Unknown CWT engine '{engine}', use 'direct', 'fft' or 'multirate'"
+            )
+        scales = np.asarray(scales)
+        output = np.empty([len(scales), len(signal)], dtype=dtype)
+
+        def store(rows, block):
+            output[rows] = block
+
+        parallel_transform(
+            signal,
+            scales,
+            store,
+            n_workers,
+            engine=engine,
+            dtype=dtype,
+            wavelet=wavelet,
+            clip_support=clip_support,
+        )
+        return output
+
+    # the wavelets get created block by block,
+    # only the output is of full size
+    if engine in ("fft", "multirate"):
+        output = np.empty([len(scales), len(signal)], dtype=dtype)
+        for rows, block in iter_transform(
+            signal,
+            np.asarray(scales),
+            engine,
+            dtype,
+            wavelet=wavelet,
+            clip_support=clip_support,
+        ):
+            output[rows] = block
+        return output
+
+    elif engine != "direct":
+        raise ValueError(
+            f"Unknown CWT engine '{engine}', use 'direct', 'fft' or 'multirate'"
+        )
 
-    to get an amplitude estimate.
-    """
+    # we want to take always the maximum support available
+    # .. no we don't -> performance, otherwise convolutions scale with N * N!!
+    # vec = np.arange(-len(signal)/2, len(signal)/2) # old default
 
-    scales = scales_from_periods(periods, 1 / dt)
+    kernels = time_kernels(wavelet, scales, len(signal), clip_support)
+    return apply_time_kernels(signal, kernels, dtype)
 
-    kappa = 1 / np.sqrt(scales) * pi ** -0.25
-    kappa = kappa * signal_std * np.sqrt(2)
 
-    return np.sqrt(powers) * kappa
+def time_kernels(wavelet, scales, Nt, clip_support=clip_support, fraction=None):
 
+    """
+    The sampled wavelets for the 'direct' CWT engine,
+    returns a list of 1d ndarrays.
+    """
 
-# ===== Fourier FFT Spectrum ================================================
+    cache_key = getattr(wavelet, "cache_key", None)
 
+    kernels = []
+    for scale in scales:
+        vec = support_vector(scale, Nt, clip_support, fraction)
 
-def compute_fourier(signal, dt):
+        if cache_key is None:
+            kernels.append(wavelet(vec, scale))
+            continue
 
-    N = len(signal)
+        # identical supports give identical wavelets
+        key = cache_key + (scale, vec[0], len(vec))
+        wavelet_data = kernel_cache.get(key)
+        if wavelet_data is None:
+            wavelet_data = kernel_cache.put(key, wavelet(vec, scale))
+        kernels.append(wavelet_data)
 
-    df = 1.0 / (N * dt)  # frequency bins
+    return kernels
 
-    rf = rfft(signal, norm="ortho")  # positive frequencies
-    # use numpy routine for sampling frequencies
-    fft_freqs = rfftfreq(len(signal), d=dt)
+
+def apply_time_kernels(signal, kernels, dtype=complex):
+
+    """
+    Convolves the *signal* with the sampled 
+    wavelets from time_kernels, *dtype* sets the 
+    precision for complex wavelets.
+    """
+
+    # test for complexity
+    if np.any([np.iscomplexobj(kernel) for kernel in kernels]):
+        output = np.zeros([len(kernels), len(signal)], dtype=dtype)
+    else:
+        dtype = real_dtype(dtype)
+        output = np.zeros([len(kernels), len(signal)], dtype=dtype)
+
+    signal = np.asarray(signal).astype(real_dtype(dtype), copy=False)
+
+    for ind, wavelet_data in enumerate(kernels):
+        wavelet_data = wavelet_data.astype(dtype, copy=False)
+        output[ind, :] = np.convolve(signal, wavelet_data, mode="same")
+
+    return output
+
+
+def fourier_kernels(
+    wavelet, scales, Nt, clip_support=clip_support, fraction=None, nfft=None
+):
+
+    """
+    Frequency domain representation of the wavelets, 
+    such that a multiplication with the (zero padded) 
+    signal transform reproduces np.convolve(signal, wavelet_data, mode='same') 
+    of the direct CWT engine.
+
+    The transform length *nfft* gets determined from the
+    longest wavelet if not given.
+
+    Returns
+    -------
+
+    nfft : int, the transform length 
+    kernels : 2d complex ndarray, len(scales) x nfft
+    """
+
+    vecs = [support_vector(scale, Nt, clip_support, fraction) for scale in scales]
+
+    # avoid wrap around with the longest wavelet
+    if nfft is None:
+        nfft = fft_length(scales, Nt, clip_support, fraction)
+
+    # angular frequencies of the transform in [-pi, pi)
+    omegas = 2 * pi * np.fft.fftfreq(nfft)
+
+    kernels = np.zeros([len(scales), nfft], dtype=complex)
+
+    cache_key = getattr(wavelet, "cache_key", None)
+
+    for ind, (scale, vec) in enumerate(zip(scales, vecs)):
+
+        if cache_key is not None:
+            key = cache_key + (
+                scale,
+                vec[0],
+                len(vec),
+                nfft,
+                clip_support,
+                peak_fraction if fraction is None else fraction,
+            )
+            kernel = kernel_cache.get(key)
+            if kernel is not None:
+                kernels[ind] = kernel
+                continue
+
+        # 'same' mode of np.convolve starts the output at (M-1)//2
+        M = len(vec)
+        shift = (M - 1) // 2
+
+        # clipped support, use the analytic transform
+        if clip_support and 2 * clipped_support(scale, fraction) <= Nt:
+            # aliases of the sampled wavelet, the sample
+            # positions are delayed by x_max - shift = 1
+            kernel = sum(
+                wavelet.fourier(omegas + 2 * pi * k, scale) for k in (-1, 0, 1)
+            )
+            kernels[ind] = kernel * np.exp(-1j * omegas * (M // 2 - shift))
+
+        # wavelet got truncated at signal length,
+        # transform the truncated wavelet itself
+        else:
+            wavelet_data = np.zeros(nfft, dtype=complex)
+            wavelet_data[:M] = wavelet(vec, scale)
+            wavelet_data = np.roll(wavelet_data, -shift)
+            kernels[ind] = sp_fft(wavelet_data)
+
+        if cache_key is not None:
+            kernel_cache.put(key, kernels[ind].copy())
+
+    return nfft, kernels
+
+
+def fft_length(scales, Nt, clip_support=clip_support, fraction=None):
+
+    """
+    Transform length for the 'fft' engine avoiding
+    wrap around effects for all *scales*.
+    """
+
+    longest = max(
+        len(support_vector(scale, Nt, clip_support, fraction)) for scale in scales
+    )
+
+    return next_fast_len(Nt + longest)
+
+
+def apply_fourier_kernels(signal, nfft, kernels, signal_ft=None, block_size=32):
+
+    """
+    The 'fft' engine of the CWT, multiplies the
+    transformed *signal* with the *kernels* from fourier_kernels.
+    An already transformed signal can be given as *signal_ft*.
+
+    The inverse transforms are batched over *block_size* kernels
+    and written into the len(kernels) x len(signal) output, so
+    only one block of length *nfft* is held at any time.
+    """
+
+    Nt = len(signal)
+
+    # transform the signal only once
+    if signal_ft is None:
+        signal_ft = sp_fft(signal, n=nfft)
+
+    output = np.empty(
+        (len(kernels), Nt), dtype=np.result_type(kernels.dtype, signal_ft.dtype)
+    )
+    for start in range(0, len(kernels), block_size):
+        rows = slice(start, start + block_size)
+        output[rows] = sp_ifft(kernels[rows] * signal_ft, axis=-1)[:, :Nt]
+
+    return output
+
+
+def iter_transform(
+    signal,
+    scales,
+    engine="direct",
+    dtype=complex,
+    block_size=32,
+    filter_bank=None,
+    scale_inds=None,
+    wavelet=None,
+    clip_support=clip_support,
+):
+
+    """
+    Generator over consecutive blocks of the wavelet
+    transform of *signal*, yields (rows, block) with rows
+    being the array of scale indices of the current block.
+    
+    Only the scales indexed by *scale_inds* get 
+    transformed if given, defaults to all scales.
+
+    Without a *filter_bank* the wavelets get created on the
+    fly block by block, so memory only scales with *block_size*.
+    Besides 'direct' and 'fft' the *engine* can also be 'multirate',
+    see multirate_row.
+    """
+
+    if scale_inds is None:
+        scale_inds = np.arange(len(scales))
+    scale_inds = np.asarray(scale_inds)
+
+    if filter_bank is not None:
+        signal = filter_bank._check_signal(signal)
+        signal_ft = None
+        if filter_bank.engine == "fft":
+            signal_ft = sp_fft(signal, n=filter_bank.nfft)
+
+        for start in range(0, len(scale_inds), block_size):
+            rows = scale_inds[start : start + block_size]
+            yield rows, filter_bank.transform(signal, rows, signal_ft)
+        return
+
+    if engine not in ("direct", "fft", "multirate"):
+        raise ValueError(
+            f"Unknown CWT engine '{engine}', use 'direct', 'fft' or 'multirate'"
+        )
+
+    Morlet = mk_Morlet(omega0) if wavelet is None else wavelet
+    Nt = len(signal)
+    signal = np.asarray(signal).astype(real_dtype(dtype), copy=False)
+
+    if engine == "multirate":
+        scales = np.asarray(scales)
+        levels = decimation_levels(scales, Nt)
+        octaves, padding = octave_signals(signal, levels[scale_inds].max())
+        # the rest is done at full rate
+        full_rate = scale_inds[levels[scale_inds] == 0]
+
+    if engine == "fft" or (engine == "multirate" and len(full_rate) > 0):
+        nfft = fft_length(
+            scales if engine == "fft" else scales[full_rate], Nt, clip_support
+        )
+        signal_ft = sp_fft(signal, n=nfft)
+
+    for start in range(0, len(scale_inds), block_size):
+        rows = scale_inds[start : start + block_size]
+
+        if engine == "multirate":
+            block = np.empty((len(rows), Nt), dtype=dtype)
+            full = levels[rows] == 0
+            if np.any(full):
+                _, kernels = fourier_kernels(
+                    Morlet, scales[rows[full]], Nt, clip_support, nfft=nfft
+                )
+                block[full] = apply_fourier_kernels(signal, nfft, kernels, signal_ft)
+            for i in np.nonzero(~full)[0]:
+                row = rows[i]
+                block[i] = multirate_row(
+                    octaves, padding, Morlet, scales[row], levels[row], Nt
+                )
+
+        elif engine == "fft":
+            _, kernels = fourier_kernels(
+                Morlet, scales[rows], Nt, clip_support, nfft=nfft
+            )
+            block = apply_fourier_kernels(
+                signal, nfft, kernels.astype(dtype, copy=False), signal_ft
+            )
+        else:
+            kernels = time_kernels(Morlet, scales[rows], Nt, clip_support)
+            block = apply_time_kernels(signal, kernels, dtype)
+
+        yield rows, block
+
+
+def n_threads(n_workers):
+
+    """
+    Number of threads for *n_workers*, None means 
+    no threading and -1 all available cores.
+    """
+
+    if n_workers is None:
+        return 1
+    if n_workers == -1:
+        return os.cpu_count() or 1
+    if n_workers < 1:
+        raise ValueError("n_workers must be a positive integer, -1 or None")
+
+    return int(n_workers)
+
+
+def parallel_transform(signal, scales, store, n_workers, **transform_kwargs):
+
+    """
+    Distributes the *scales* over a pool of *n_workers* threads, 
+    each thread runs iter_transform over its share of the scales 
+    and hands the blocks to *store(rows, block)*. The shares are 
+    disjoint, so *store* can write into rows of a preallocated 
+    output without locking. The scales get dealt out in turn,
+    such that the expensive large scales are spread evenly.
+
+    The convolutions and FFTs release the GIL, so the
+    threads really run in parallel.
+    """
+
+    n_workers = min(n_threads(n_workers), len(scales))
+    shares = [np.arange(i, len(scales), n_workers) for i in range(n_workers)]
+
+    def work(share):
+        for rows, block in iter_transform(
+            signal, scales, scale_inds=share, **transform_kwargs
+        ):
+            store(rows, block)
+
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        # re-raises exceptions from the threads
+        list(pool.map(work, shares))
+
+
+def decimation_levels(scales, Nt, min_scale=None):
+
+    """
+    Number of octaves the signal can be decimated for each scale,
+    such that the decimated scale stays above *min_scale*
+    (defaults to the global mr_min_scale). Scales whose wavelet
+    support gets truncated at the signal length stay at full rate (0).
+    """
+
+    if min_scale is None:
+        min_scale = mr_min_scale
+
+    scales = np.asarray(scales)
+    levels = np.floor(np.log2(scales / min_scale)).astype(int)
+    levels = np.maximum(levels, 0)
+
+    truncated = np.array([2 * clipped_support(scale) > Nt for scale in scales])
+    levels[truncated] = 0
+
+    return levels
+
+
+def octave_signals(signal, max_level):
+
+    """
+    Successively low-pass filters and decimates the *signal*
+    by factors of two, returns the list of the *max_level* + 1 
+    octave signals and the zero padding applied before decimation.
+
+    The half-band filter passes the wavelet bands of 
+    decimation_levels with ~1e-6 relative error and 
+    suppresses aliasing by ~-120dB.
+    """
+
+    halfband = firwin(63, 0.5, window=("kaiser", 12.0))
+
+    # zero padding keeps the filter responses at the signal edges,
+    # multiple of the largest decimation factor to keep the sample grid
+    padding = 32 * 2 ** max_level
+    octaves = [np.pad(signal, (padding, padding))]
+
+    for level in range(max_level):
+        octaves.append(resample_poly(octaves[-1], 1, 2, window=halfband))
+
+    return octaves, padding
+
+
+def multirate_row(octaves, padding, wavelet, scale, level, Nt, extra=4):
+
+    """
+    Wavelet transform at a single *scale* from the octave signal 
+    decimated by D = 2**level, see octave_signals. The convolution 
+    runs with the wavelet at scale/D on the coarse grid, the result 
+    gets interpolated back onto the original time grid: the slowly 
+    varying envelope after demodulation with the wavelet's central 
+    frequency by cubic splines. 
+
+    Reproduces the 'direct' engine to about 1e-5 of the maximal 
+    coefficient at that scale, including the boundaries.
+    """
+
+    D = 2 ** level
+    coarse_scale = scale / D
+
+    x_max = clipped_support(coarse_scale)
+    vec = np.arange(-x_max, x_max + 1)
+    # the Riemann sum on the coarse grid gets the factor D
+    wavelet_data = wavelet(vec, coarse_scale) * np.sqrt(D)
+
+    # odd length wavelet keeps 'same' output centered
+    coarse = fftconvolve(octaves[level], wavelet_data, mode="same")
+    t_coarse = np.arange(len(coarse)) * D - padding
+
+    # restrict to the neighbourhood of the signal
+    inside = (t_coarse >= -(extra + 1) * D) & (t_coarse <= Nt + extra * D)
+    t_coarse = t_coarse[inside]
+
+    omega_c = omega0 / scale
+    envelope = coarse[inside] * np.exp(-1j * omega_c * t_coarse)
+
+    # the direct engine output is delayed by one sample
+    tvec = np.arange(Nt) - 1.0
+    envelope = CubicSpline(t_coarse, envelope)(tvec)
+
+    return envelope * np.exp(1j * omega_c * tvec)
+
+
+class FilterBank:
+
+    """
+    Precomputed Morlet wavelets for signals of length *Nt*, 
+    sampled with *dt* and analyzed for the given *periods*. 
+    Create once and pass to compute_spectrum, compute_spectra
+    or the WAnalyzer to reuse the wavelets for many signals of the 
+    same length. 
+
+    Holds only arrays and parameters, so it can be pickled and 
+    shipped to worker processes.
+    """
+
+    def __init__(
+        self,
+        Nt,
+        dt,
+        periods,
+        omega0=omega0,
+        fraction=None,
+        engine="direct",
+        dtype=complex,
+    ):
+
+        """
+        Nt       : int, the number of samples of the signals
+
+        dt       : the sampling interval scaled to desired time units
+
+        periods  : the list of periods to compute the Wavelet spectrum for, 
+                   must have same units as dt!
+
+        omega0   : central frequency of the Morlet
+
+        fraction : clip the Wavelets at 1/fraction of their peak,
+                   defaults to the global peak_fraction
+
+        engine   : either 'direct' or 'fft', see CWT. The default
+                   'direct' reproduces compute_spectrum exactly, 'fft'
+                   is faster for long signals and deviates
+                   by ~1e-6 relative
+
+        dtype    : complex dtype of the wavelets and the transforms,
+                   np.complex64 for single precision
+        """
+
+        if fraction is None:
+            fraction = peak_fraction
+
+        self.Nt = int(Nt)
+        self.dt = float(dt)
+        self.periods = np.array(periods, dtype=float)
+        self.omega0 = omega0
+        self.peak_fraction = fraction
+        self.engine = engine
+        self.dtype = np.dtype(dtype)
+
+        self.scales = scales_from_periods(self.periods, 1 / self.dt, omega0)
+
+        # the closure itself is not picklable, so don't keep it
+        Morlet = mk_Morlet(omega0)
+
+        if engine == "fft":
+            self.nfft, self.kernels = fourier_kernels(
+                Morlet, self.scales, self.Nt, fraction=fraction
+            )
+            self.kernels = self.kernels.astype(self.dtype, copy=False)
+        elif engine == "direct":
+            self.nfft = None
+            self.kernels = [
+                kernel.astype(self.dtype, copy=False)
+                for kernel in time_kernels(
+                    Morlet, self.scales, self.Nt, fraction=fraction
+                )
+            ]
+        else:
+            raise ValueError(f"Unknown CWT engine '{engine}', use 'direct' or 'fft'")
+
+    @property
+    def key(self):
+        return (
+            self.Nt,
+            self.dt,
+            tuple(self.periods),
+            self.omega0,
+            self.peak_fraction,
+            self.dtype.str,
+        )
+
+    @property
+    def nbytes(self):
+
+        """ Memory footprint of the precomputed wavelets in bytes """
+
+        if self.engine == "fft":
+            return self.kernels.nbytes
+        return sum(kernel.nbytes for kernel in self.kernels)
+
+    def matches(self, Nt, dt, periods, omega0=omega0, dtype=None, fraction=None):
+
+        """
+        True if this bank holds the wavelets for
+        the given analysis parameters, *dtype* only
+        gets checked if given, *fraction* defaults
+        to the global peak_fraction.
+        """
+
+        if dtype is not None and np.dtype(dtype) != self.dtype:
+            return False
+
+        if fraction is None:
+            fraction = peak_fraction
+
+        return (
+            self.Nt == int(Nt)
+            and self.peak_fraction == fraction
+            and self.dt == float(dt)
+            and self.omega0 == omega0
+            and len(self.periods) == len(periods)
+            and np.all(self.periods == np.asarray(periods, dtype=float))
+        )
+
+    def _check_signal(self, signal):
+
+        if len(signal) != self.Nt:
+            raise ValueError(
+                f"FilterBank is for signals of length {self.Nt}, got {len(signal)}!"
+            )
+
+        return np.asarray(signal).astype(real_dtype(self.dtype), copy=False)
+
+    def transform(self, signal, rows=None, signal_ft=None):
+
+        """
+        The complex wavelet transform of *signal*, 
+        see CWT. No mean subtraction is done here!
+
+        rows      : optional slice or sequence of period indices, 
+                    only these rows of the transform get computed
+
+        signal_ft : the signal already transformed with 
+                    length nfft, only used by the 'fft' engine
+        """
+
+        signal = self._check_signal(signal)
+
+        if rows is None:
+            rows = slice(None)
+
+        if self.engine == "fft":
+            return apply_fourier_kernels(
+                signal, self.nfft, self.kernels[rows], signal_ft
+            )
+
+        if isinstance(rows, slice):
+            kernels = self.kernels[rows]
+        else:
+            kernels = [self.kernels[row] for row in rows]
+        return apply_time_kernels(signal, kernels, self.dtype)
+
+    def __repr__(self):
+        return (
+            f"FilterBank(Nt={self.Nt}, dt={self.dt}, "
+            f"{len(self.periods)} periods {self.periods[0]:.2f}-{self.periods[-1]:.2f}, "
+            f"engine='{self.engine}', dtype={self.dtype}, {self.nbytes / 1e6:.1f}MB)"
+        )
+
+
+class SpectrumResult:
+
+    """
+    Holds the Wavelet transform of a *signal* together with 
+    the analysis parameters, derived quantities like the 
+    modulus, the variance, the COI mask, the time-averaged 
+    spectrum or ridge readouts get computed only when asked 
+    for and are then kept.
+
+    Can be passed to eval_ridge, the plotting functions and 
+    is used by the WAnalyzer. For backwards compatibility it 
+    unpacks like the tuple returned by compute_spectrum:
+
+        modulus, wlet = result
+    """
+
+    def __init__(self, wlet, signal, periods, dt, modulus=None):
+
+        """
+        wlet    : 2d complex ndarray, the Wavelet transform,
+                  can be None if only the *modulus* is known
+
+        signal  : 1d ndarray, the analyzed signal
+
+        periods : the periods of the transform
+
+        dt      : the sampling interval
+
+        modulus : optional, the already computed modulus
+        """
+
+        if wlet is None and modulus is None:
+            raise ValueError("Need at least the transform or the modulus!")
+
+        self._wlet = wlet
+        self.signal = np.asarray(signal)
+        self.periods = np.asarray(periods)
+        self.dt = float(dt)
+
+        self._modulus = modulus
+        self._cache = {}
+
+    def _memo(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    @property
+    def wlet(self):
+
+        """ The complex Wavelet transform, None for power only results """
+
+        return self._wlet
+
+    @wlet.setter
+    def wlet(self, wlet):
+
+        # everything derived gets recomputed
+        self._wlet = wlet
+        self._modulus = None
+        self._cache = {}
+
+    @property
+    def Nt(self):
+        return len(self.signal)
+
+    @property
+    def tvec(self):
+        return self._memo("tvec", lambda: np.arange(self.Nt) * self.dt)
+
+    @property
+    def variance(self):
+
+        """ Signal variance in the precision of the transform """
+
+        if self.wlet is not None:
+            ftype = self.wlet.real.dtype.type
+        else:
+            ftype = self._modulus.dtype.type
+
+        return self._memo("variance", lambda: ftype(np.var(self.signal)))
+
+    @property
+    def modulus(self):
+
+        """ The Wavelet power normalized by the signal variance """
+
+        if self._modulus is None:
+            # white noise has then mean power of one
+            self._modulus = np.abs(self.wlet) ** 2 / self.variance
+        return self._modulus
+
+    @modulus.setter
+    def modulus(self, modulus):
+
+        # the ridge and averages derive from the modulus
+        self._modulus = modulus
+        self._cache = {}
+
+    @property
+    def coi_mask(self):
+
+        """ Boolean mask, True inside the (left or right) cone of influence """
+
+        def compute():
+            tvec = self.tvec
+            # distance to the nearest boundary
+            dist = np.minimum(tvec, tvec[-1] - tvec)
+            return self.periods[:, None] > Morlet_COI() * dist[None, :]
+
+        return self._memo("coi_mask", compute)
+
+    @property
+    def time_averaged(self):
+
+        """ The time-averaged power spectrum """
+
+        return self._memo("time_averaged", lambda: self.modulus.mean(axis=1))
+
+    @property
+    def ridge_y(self):
+
+        """ The maximum ridge, see get_maxRidge_ys """
+
+        return self._memo("ridge_y", lambda: get_maxRidge_ys(self.modulus))
+
+    def get_ridge(self, power_thresh=0, smoothing_wsize=None):
+
+        """
+        Readout along the maximum ridge, see eval_ridge.
+        Returns a copy, changing it leaves the memoized readout intact.
+        """
+
+        if self.wlet is None:
+            raise ValueError("Need the complex transform for the ridge readout!")
+
+        key = ("ridge", power_thresh, smoothing_wsize)
+        return self._memo(
+            key,
+            lambda: eval_ridge(
+                self.ridge_y,
+                self,
+                power_thresh=power_thresh,
+                smoothing_wsize=smoothing_wsize,
+            ),
+        ).copy()
+
+    def __iter__(self):
+        return iter((self.modulus, self.wlet))
+
+    def __repr__(self):
+        return (
+            f"SpectrumResult(Nt={self.Nt}, dt={self.dt}, "
+            f"periods={self.periods[0]:.2f}..{self.periods[-1]:.2f} "
+            f"({len(self.periods)}))"
+        )
+
+
+class OnlineCWT:
+
+    """
+    Incremental Wavelet transform of a growing signal, 
+    e.g. during a running acquisition. New samples get 
+    appended with *append*, which only recomputes the trailing
+    columns within the wavelet support of each scale. The update 
+    cost thus depends on the largest wavelet support and the 
+    number of new samples, not on the length of the recording.
+
+    Column t at a given scale is final once all samples 
+    within half the wavelet support right of t arrived, see 
+    *final_columns*. The transform equals the 'direct' engine 
+    of compute_spectrum for a signal with zero mean, once 
+    the recording is longer than the largest wavelet support. 
+    There is no mean subtraction, so samples should get 
+    detrended/centered beforehand.
+    """
+
+    def __init__(self, dt, periods, omega0=omega0, dtype=complex, capacity=1024):
+
+        """
+        dt       : the sampling interval scaled to desired time units
+
+        periods  : the list of periods to compute the Wavelet spectrum for, 
+                   must have same units as dt!
+
+        omega0   : central frequency of the Morlet
+
+        dtype    : complex dtype of the transform
+
+        capacity : number of samples to preallocate for,
+                   the buffers grow automatically
+        """
+
+        self.dt = float(dt)
+        self.periods = np.array(periods, dtype=float)
+        self.dtype = np.dtype(dtype)
+        self.scales = scales_from_periods(self.periods, 1 / self.dt, omega0)
+
+        # full supports, kernels never get truncated
+        Morlet = mk_Morlet(omega0)
+        self.kernels = time_kernels(Morlet, self.scales, np.inf)
+        # np.convolve 'same' centers the kernels at (M - 1) // 2
+        self.shifts = np.array([(len(kernel) - 1) // 2 for kernel in self.kernels])
+
+        self.Nt = 0
+        self._signal = np.zeros(capacity)
+        self._wlet = np.zeros((len(self.periods), capacity), dtype=self.dtype)
+        self._ridge_y = np.zeros(capacity, dtype=int)
+
+        # running sums for the variance
+        self._sum = 0.0
+        self._sum2 = 0.0
+
+    def _grow(self, Nt):
+
+        capacity = len(self._signal)
+        if Nt <= capacity:
+            return
+
+        while capacity < Nt:
+            capacity *= 2
+
+        signal = np.zeros(capacity)
+        signal[: self.Nt] = self._signal[: self.Nt]
+        wlet = np.zeros((len(self.periods), capacity), dtype=self.dtype)
+        wlet[:, : self.Nt] = self._wlet[:, : self.Nt]
+        ridge_y = np.zeros(capacity, dtype=int)
+        ridge_y[: self.Nt] = self._ridge_y[: self.Nt]
+
+        self._signal, self._wlet, self._ridge_y = signal, wlet, ridge_y
+
+    def append(self, samples):
+
+        """
+        Appends the new *samples* and updates the affected 
+        columns of the transform and the maximum ridge.
+
+        Returns the slice of updated columns.
+        """
+
+        samples = np.atleast_1d(np.asarray(samples, dtype=float))
+        if np.any(np.isnan(samples)):
+            raise ValueError("Samples contain NaNs!")
+
+        N0 = self.Nt
+        N1 = N0 + len(samples)
+        if N1 == N0:
+            return slice(N0, N0)
+
+        self._grow(N1)
+        self._signal[N0:N1] = samples
+        self._sum += samples.sum()
+        self._sum2 += (samples ** 2).sum()
+        self.Nt = N1
+
+        x = self._signal
+        for ind, (kernel, shift) in enumerate(zip(self.kernels, self.shifts)):
+            # first column seeing the new samples
+            start = max(0, N0 - shift)
+            # first sample under the kernel at that column
+            m0 = max(0, start + shift - len(kernel) + 1)
+            conv = fftconvolve(x[m0:N1], kernel)
+            self._wlet[ind, start:N1] = conv[start + shift - m0 : N1 + shift - m0]
+
+        # the maximum ridge, only for the changed columns
+        start = max(0, N0 - int(self.shifts.max()))
+        self._ridge_y[start:N1] = np.argmax(np.abs(self._wlet[:, start:N1]), axis=0)
+
+        return slice(start, N1)
+
+    @property
+    def signal(self):
+        return self._signal[: self.Nt]
+
+    @property
+    def wlet(self):
+
+        """ The complex transform so far, a view of the internal buffer """
+
+        return self._wlet[:, : self.Nt]
+
+    @property
+    def tvec(self):
+        return np.arange(self.Nt) * self.dt
+
+    @property
+    def variance(self):
+
+        """ Variance of all samples so far, updated in O(1) """
+
+        if self.Nt == 0:
+            return np.nan
+        mean = self._sum / self.Nt
+        return self._sum2 / self.Nt - mean ** 2
+
+    @property
+    def final_columns(self):
+
+        """ Number of final columns per scale """
+
+        return np.maximum(self.Nt - self.shifts, 0)
+
+    @property
+    def n_final(self):
+
+        """ Number of columns which are final for all scales """
+
+        return max(self.Nt - int(self.shifts.max()), 0)
+
+    @property
+    def coi_mask(self):
+
+        """
+        Boolean mask of the spectrum, True for the 
+        points inside the right cone of influence.
+        """
+
+        t_left = (self.Nt - 1 - np.arange(self.Nt)) * self.dt
+        return self.periods[:, None] > Morlet_COI() * t_left[None, :]
+
+    @property
+    def modulus(self):
+
+        """ The Wavelet power normalized by the signal variance """
+
+        sig2 = self._wlet.real.dtype.type(self.variance)
+        return np.abs(self.wlet) ** 2 / sig2
+
+    @property
+    def ridge_y(self):
+
+        """ The maximum ridge so far, see get_maxRidge_ys """
+
+        return self._ridge_y[: self.Nt]
+
+    def get_ridge(self, power_thresh=0, smoothing_wsize=None):
+
+        """
+        Readout along the current maximum ridge, 
+        see eval_ridge for the parameters and the 
+        returned DataFrame.
+        """
+
+        ridge_y = self.ridge_y
+        ridge_z = self.wlet[ridge_y, np.arange(self.Nt)]
+
+        return eval_ridge(
+            ridge_y,
+            ridge_z,
+            self.signal,
+            self.periods,
+            self.tvec,
+            power_thresh,
+            smoothing_wsize,
+        )
+
+    def __repr__(self):
+        return (
+            f"OnlineCWT(Nt={self.Nt}, dt={self.dt}, "
+            f"periods={self.periods[0]:.2f}..{self.periods[-1]:.2f} "
+            f"({len(self.periods)}), final={self.n_final})"
+        )
+
+
+def Morlet_COI(omega0=omega0):
+    # slope of Morlet e-folding time in tau-periods (spectral) view
+    m = 4 * pi / (np.sqrt(2) * (omega0 + np.sqrt(2 + omega0 ** 2)))
+    return m
+
+
+def power_to_amplitude(periods, powers, signal_std, dt):
+
+    """
+    Rescale Morlet wavelet powers according to the
+    definition of 
+
+    "On the Analytic Wavelet Transform",
+    Jonathan M. Lilly 2010
+
+    to get an amplitude estimate.
+    """
+
+    scales = scales_from_periods(periods, 1 / dt)
+
+    kappa = 1 / np.sqrt(scales) * pi ** -0.25
+    kappa = kappa * signal_std * np.sqrt(2)
+
+    return np.sqrt(powers) * kappa
+
+
+# ===== Fourier FFT Spectrum ================================================
+
+
+def compute_fourier(signal, dt):
+
+    N = len(signal)
+
+    df = 1.0 / (N * dt)  # frequency bins
+
+    rf = rfft(signal, norm="ortho")  # positive frequencies
+    # use numpy routine for sampling frequencies
+    fft_freqs = rfftfreq(len(signal), d=dt)
 
     # print(N,dt,df)
     # print(len(fft_freqs),len(rf))
@@ -709,25 +2796,353 @@ def ar1_powerspec(alpha, periods, dt):
     return res
 
 
-def ar1_sim(alpha, N, sigma=1, x0=None):
+def ar1_estimate(signal):
+
+    """
+    Estimates the AR1 parameter alpha of a *signal* by its lag-1 
+    autocorrelation. For a 2d array of signals (one per row) 
+    returns the alpha for each signal.
+    """
+
+    signal = np.asarray(signal, dtype=float)
+    centered = signal - signal.mean(axis=-1, keepdims=True)
+
+    lag1 = np.sum(centered[..., 1:] * centered[..., :-1], axis=-1)
+    lag0 = np.sum(centered ** 2, axis=-1)
+
+    return lag1 / lag0
+
+
+def ar1_confidence(modulus, alpha, periods=None, dt=None):
+
+    """
+    Significance of the Wavelet power against an AR1 background,
+    the power spectrum normalized with the AR1 spectrum follows a 
+    chi-square distribution with two degrees of freedom.
+
+    Parameters
+    ----------
+
+    modulus : ndarray, the Wavelet power spectrum normalized to the 
+              signal variance of shape (len(periods), Nt), or a stack 
+              of spectra of shape (Nsignals, len(periods), Nt) as from 
+              compute_spectra. Can also be a SpectrumResult.
+
+    alpha   : float, the AR1 parameter, see ar1_estimate. 
+              For a stack of spectra one alpha per spectrum can be given.
+
+    periods : the periods of the spectrum, taken from a SpectrumResult 
+
+    dt      : the sampling interval, taken from a SpectrumResult
+
+    Returns
+    -------
+
+    mask95 : boolean ndarray of the shape of *modulus*, 
+             True where the power is significant at the 95% level
+
+    mask99 : as mask95 for the 99% level
+    """
+
+    if isinstance(modulus, SpectrumResult):
+        periods, dt = modulus.periods, modulus.dt
+        modulus = modulus.modulus
+
+    if periods is None or dt is None:
+        raise ValueError("Need the periods and dt of the spectrum!")
+
+    # one AR1 spectrum per alpha
+    alpha = np.asarray(alpha, dtype=float)[..., None]
+    ar1power = ar1_powerspec(alpha, np.asarray(periods), dt)[..., None]
+
+    scaled_mod = modulus / ar1power
+
+    return scaled_mod > xi2_95 / 2.0, scaled_mod > xi2_99 / 2.0
+
+
+def significant_fraction(mask):
+
+    """
+    Fraction of significant periods for every time point,
+    *mask* is a (stack of) boolean significance masks
+    as from ar1_confidence.
+    """
+
+    return mask.mean(axis=-2)
+
+
+def ridge_significance(ridge_data, alpha, dt, level=95):
+
+    """
+    Boolean array, True for the ridge points whose power 
+    is significant against an AR1 background with parameter 
+    *alpha* at the given *level* (95 or 99), see ar1_confidence.
+    *ridge_data* is a DataFrame as returned by eval_ridge.
+    """
+
+    if level == 95:
+        thresh = xi2_95 / 2.0
+    elif level == 99:
+        thresh = xi2_99 / 2.0
+    else:
+        raise ValueError("Significance level must be 95 or 99!")
+
+    ar1power = ar1_powerspec(alpha, ridge_data["periods"].to_numpy(), dt)
+
+    return ridge_data["power"].to_numpy() / ar1power > thresh
+
+
+def significant_ridge(ridge_data, signal, dt, level=95):
+
+    """
+    Keeps only the ridge points of *ridge_data* significant 
+    against an AR1 background estimated from the analyzed
+    *signal* at the given *level*, see ridge_significance.
+
+    Returns the filtered DataFrame with a fresh index, as
+    find_COI_crossing indices are used as positions.
+    """
+
+    alpha = ar1_estimate(signal)
+    significant = ridge_significance(ridge_data, alpha, dt, level)
+
+    return ridge_data[significant].reset_index(drop=True)
+
+
+def ar1_sim(alpha, N, sigma=1, x0=None, n_realizations=None, rng=None):
+
+    """
+    Simulates AR1 processes x_i = alpha * x_{i-1} + sigma * eps_i
+    with standard normal eps_i, by a recursive linear filter.
+
+    Parameters
+    ----------
+
+    alpha : float, the AR1 parameter 0 <= alpha < 1
+
+    N     : int, number of samples
+
+    sigma : float, noise intensity
+
+    x0    : initial value(s), drawn standard normal if None, 
+            can be one per realization
+
+    n_realizations : int, if given returns an array of shape
+                     (n_realizations, N), one realization per row
+
+    rng   : optional numpy.random.Generator, if None the 
+            global numpy random state is used
+
+    Returns
+    -------
+
+    sol : ndarray, of shape (N,) or (n_realizations, N)
+    """
 
     N = int(N)
-    sol = np.zeros(N)
+    shape = (N,) if n_realizations is None else (int(n_realizations), N)
 
-    if x0 is None:
-        x0 = randn()
+    if rng is None:
+        noise = randn(*shape)
+    else:
+        noise = rng.standard_normal(shape)
 
-    sol[0] = x0
+    # the first 'innovation' is the initial value
+    if x0 is None:
+        x0 = noise[..., 0].copy()
+    noise *= sigma
+    noise[..., 0] = x0
 
-    for i in range(1, N):
-        sol[i] = alpha * sol[i - 1] + sigma * randn()
+    sol = lfilter([1.0], [1.0, -alpha], noise, axis=-1)
 
     return sol
 
 
+# ============ Kernel Cache =====================================
+
+
+class ArrayCache:
+
+    """
+    Least recently used cache for ndarrays, bounded
+    by the total memory of the cached arrays. 
+
+    Cached arrays are set read-only, as they
+    are shared between all callers. Access is 
+    locked, so threads can share the cache.
+    """
+
+    def __init__(self, max_bytes):
+
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._store = OrderedDict()
+        self._lock = RLock()
+
+    def get(self, key):
+
+        """ Returns the cached array or None """
+
+        with self._lock:
+            arr = self._store.get(key)
+            if arr is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._store.move_to_end(key)
+            return arr
+
+    def put(self, key, arr):
+
+        # too big to be cached at all
+        if arr.nbytes > self.max_bytes:
+            return arr
+
+        arr.flags.writeable = False
+        with self._lock:
+            if key in self._store:
+                self.nbytes -= self._store.pop(key).nbytes
+            self._store[key] = arr
+            self.nbytes += arr.nbytes
+            self._evict()
+
+        return arr
+
+    def _evict(self):
+
+        # drop least recently used arrays first
+        while self.nbytes > self.max_bytes:
+            _, arr = self._store.popitem(last=False)
+            self.nbytes -= arr.nbytes
+
+    def set_limit(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._store.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._store),
+            "nbytes": self.nbytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+# process wide cache for wavelets and sinc filters
+kernel_cache = ArrayCache(max_bytes=256 * 2 ** 20)
+
+
+def cache_info():
+
+    """ Hits, misses and memory usage of the kernel cache """
+
+    return kernel_cache.info()
+
+
+def clear_cache():
+    kernel_cache.clear()
+
+
+def set_cache_limit(max_bytes):
+
+    """ Maximal memory in bytes for the cached kernels """
+
+    kernel_cache.set_limit(max_bytes)
+
+
 # ========= Utility functions ==============
 
 
+def open_out(out, shape, dtype):
+
+    """
+    Resolves an output target for the spectra:
+
+    None      : a new in-memory array
+    file path : a new .npy file, memory mapped, 
+                reload with np.load(path, mmap_mode='r')
+    array     : e.g. a np.memmap, gets checked for shape and dtype
+    """
+
+    if out is None:
+        return np.empty(shape, dtype=dtype)
+
+    if isinstance(out, (str, os.PathLike)):
+        return np.lib.format.open_memmap(out, mode="w+", dtype=dtype, shape=shape)
+
+    if out.shape != tuple(shape) or out.dtype != np.dtype(dtype):
+        raise ValueError(
+            f"Output target needs shape {tuple(shape)} and dtype {np.dtype(dtype)}, "
+            f"got {out.shape} and {out.dtype}!"
+        )
+
+    return out
+
+
+def flush_out(*outs):
+
+    """ Writes memory mapped outputs to disc """
+
+    for out in outs:
+        if isinstance(out, np.memmap):
+            out.flush()
+
+
+def apply_valid_rows(func, signals):
+
+    """
+    Applies *func* to all signals (rows) of the 2d array *signals*,
+    skipping their NaNs. Rows with the same number of valid samples
+    get compacted into one 2d block and processed by a single call
+    of *func*, which has to return a block of the same shape.
+
+    Returns an array of the shape of *signals*, NaN where the 
+    input was NaN.
+    """
+
+    signals = np.asarray(signals, dtype=float)
+    valid = ~np.isnan(signals)
+    lengths = valid.sum(axis=1)
+
+    res = np.full(signals.shape, np.nan)
+
+    for Nt in np.unique(lengths):
+        if Nt == 0:
+            continue
+        rows = np.nonzero(lengths == Nt)[0]
+        mask = valid[rows]
+        # boolean indexing keeps the row-major order
+        block = signals[rows][mask].reshape(len(rows), Nt)
+
+        out = res[rows]
+        out[mask] = func(block).ravel()
+        res[rows] = out
+
+    return res
+
+
+def real_dtype(dtype):
+
+    """
+    The real counterpart of a (complex) dtype,
+    e.g. float32 for complex64
+    """
+
+    return np.finfo(dtype).dtype
+
+
 def complex_average(phis, axis=0):
 
     """
@@ -0,0 +1,264 @@
+''' Headless batch analysis of signal ensembles with a process pool '''
+
+import os
+from functools import partial
+from multiprocessing import Pool
+
+import numpy as np
+
+from pyboat import core
+
+# the wavelets of the last signal length,
+# each worker process holds its own
+_filter_bank = None
+
+
+def worker_filter_bank(Nt, dt, periods, engine='direct'):
+
+    '''
+    The FilterBank of the current process, gets
+    rebuilt only if the analysis parameters change,
+    so consecutive signals of the same length share it.
+    '''
+
+    global _filter_bank
+
+    if (
+        _filter_bank is None
+        or _filter_bank.engine != engine
+        or not _filter_bank.matches(Nt, dt, periods)
+    ):
+        _filter_bank = core.FilterBank(Nt, dt, periods, engine=engine)
+
+    return _filter_bank
+
+
+def pool_imap(worker, items, n_workers=None, chunksize=None):
+
+    '''
+    Generator over worker(item) for all *items* in their order,
+    computed by a pool of *n_workers* processes. None uses all
+    cores and 1 runs everything in the calling process. The
+    *chunksize* defaults to about four chunks per process.
+    Closing the generator early terminates the pool.
+    '''
+
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    n_workers = max(1, min(n_workers, len(items)))
+
+    if n_workers == 1:
+        yield from map(worker, items)
+        return
+
+    if chunksize is None:
+        chunksize = max(1, len(items) // (4 * n_workers))
+
+    with Pool(n_workers) as pool:
+        # imap keeps the order
+        yield from pool.imap(worker, items, chunksize=chunksize)
+
+
+def collect_signals(results, progress=None):
+
+    '''
+    Dictionary of the (signal_id, value) *results*, signals
+    with None values get skipped with a message. *progress*
+    gets called with the number of processed signals.
+    '''
+
+    collected = {}
+    for i, (signal_id, value) in enumerate(results):
+        if value is None:
+            print(f"Can't process signal {signal_id}..")
+        else:
+            collected[signal_id] = value
+        if progress is not None:
+            progress(i + 1)
+
+    return collected
+
+
+def prepare_signal(signal, dt, T_c=False, L=False):
+
+    '''
+    NaN removal, sinc detrending with cut off period *T_c* and 
+    amplitude normalization with window size *L*, as done 
+    for the batch analysis. Falsy *T_c* or *L* skip the 
+    respective step. Returns None if no valid samples are left.
+    '''
+
+    signal = np.asarray(signal, dtype=float)
+    signal = signal[~np.isnan(signal)]
+    if len(signal) == 0:
+        return None
+
+    if T_c:
+        signal = signal - core.sinc_smooth(signal, T_c, dt)
+
+    # amplitude normalization is downstream of detrending
+    if L:
+        signal = core.normalize_with_envelope(signal, L, dt)
+
+    return signal
+
+
+def analyze_signal(
+    signal,
+    dt,
+    periods,
+    T_c=False,
+    L=False,
+    power_thresh=0,
+    smoothing_wsize=None,
+    significance=None,
+):
+
+    '''
+    Detrending, amplitude normalization and maximum ridge
+    readout for a single signal, the batch analysis
+    as done by the 'Analyze All..' UI.
+
+    Parameters
+    ----------
+
+    signal  : a sequence, NaNs get removed
+
+    dt      : the sampling interval scaled to desired time units
+
+    periods : the periods to compute the Wavelet spectrum for
+
+    T_c     : cut off period for the sinc detrending,
+              *False* or None for no detrending
+
+    L       : sliding window size for the amplitude normalization,
+              *False* or None for no normalization
+
+    power_thresh : threshold for the ridge power, see core.eval_ridge
+
+    smoothing_wsize : window size for the ridge smoothing, see core.eval_ridge
+
+    significance : None, 95 or 99, keep only the ridge points
+                   significant against an AR1 background estimated
+                   from the analyzed signal at that level,
+                   see core.significant_ridge
+
+    Returns
+    -------
+
+    ridge_data : DataFrame holding the ridge readout, see core.eval_ridge
+                 None if the signal holds no valid samples
+    '''
+
+    signal = prepare_signal(signal, dt, T_c, L)
+    if signal is None:
+        return None
+
+    ridge_data = core.compute_ridge(
+        signal,
+        dt,
+        periods,
+        power_thresh,
+        smoothing_wsize=smoothing_wsize,
+        filter_bank=worker_filter_bank(len(signal), dt, periods),
+    )
+
+    if significance is not None:
+        ridge_data = core.significant_ridge(ridge_data, signal, dt, significance)
+
+    return ridge_data
+
+
+def _analyze_item(item, **settings):
+
+    ''' Worker entry point, *item* is a (signal_id, signal) tuple '''
+
+    signal_id, signal = item
+    return signal_id, analyze_signal(signal, **settings)
+
+
+def ensemble_ridges(
+    df,
+    dt,
+    wlet_pars,
+    power_thresh=0,
+    smoothing_wsize=None,
+    significance=None,
+    n_workers=None,
+    chunksize=None,
+    progress=None,
+):
+
+    '''
+    Ridge analysis of all signals (columns) of the DataFrame *df*
+    distributed over a pool of processes.
+
+    Parameters
+    ----------
+
+    df        : DataFrame with one signal per column, NaNs
+                (e.g. from different signal lengths) get removed
+
+    dt        : the sampling interval scaled to desired time units
+
+    wlet_pars : dictionary with the analysis parameters as
+                retrieved by the DataViewer:
+
+                'T_min', 'T_max', 'step_num' : the periods
+                'T_c' : cut off period, False for no detrending
+                'L'   : amplitude envelope window size, False for
+                        no amplitude normalization
+
+    power_thresh : threshold for the ridge power, see core.eval_ridge
+
+    smoothing_wsize : window size for the ridge smoothing, see core.eval_ridge
+
+    significance : None, 95 or 99, filter the ridge points by their 
+                   significance against an AR1 background, 
+                   see analyze_signal
+
+    n_workers : number of processes, None uses all cores and 1
+                processes all signals in the calling process
+
+    chunksize : number of signals sent to a process at once,
+                defaults to about four chunks per process
+
+    progress  : optional callable, gets called with the
+                number of processed signals
+
+    Returns
+    -------
+
+    ridge_results : dictionary with the signal_ids as keys and
+                    the ridge readout DataFrames as values, in the
+                    order of the columns. Signals without valid samples
+                    are skipped. See ensemble_measures for the
+                    downstream analysis.
+    '''
+
+    periods = np.linspace(
+        wlet_pars['T_min'],
+        wlet_pars['T_max'],
+        wlet_pars['step_num'])
+
+    # detrend and normalize the whole table at once
+    if wlet_pars.get('T_c'):
+        df = core.sinc_detrend_frame(df, wlet_pars['T_c'], dt)
+
+    if wlet_pars.get('L'):
+        df = core.normalize_frame(df, wlet_pars['L'], dt)
+
+    settings = dict(
+        dt=dt,
+        periods=periods,
+        T_c=False,
+        L=False,
+        power_thresh=power_thresh,
+        smoothing_wsize=smoothing_wsize,
+        significance=significance,
+    )
+    worker = partial(_analyze_item, **settings)
+
+    items = [(signal_id, df[signal_id].to_numpy()) for signal_id in df]
+
+    return collect_signals(pool_imap(worker, items, n_workers, chunksize), progress)
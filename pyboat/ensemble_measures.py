@@ -124,9 +124,7 @@ if __name__ == '__main__':
         for T in np.linspace(T1, 50, Nsignals) ]
 
     # add the same amount of pure noise
-    noisy_ones = [
-        ssg.ar1_sim(alpha = 0.5, N = Nt)
-        for i in range(Nsignals)]
+    noisy_ones = list(ssg.ar1_sim(alpha = 0.5, N = Nt, n_realizations = Nsignals))
 
     signals = signals + noisy_ones
 
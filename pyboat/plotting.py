@@ -3,7 +3,7 @@ import numpy as np
 from numpy import pi
 from scipy.stats import gaussian_kde, iqr
 
-from pyboat.core import Morlet_COI, find_COI_crossing
+from pyboat.core import Morlet_COI, find_COI_crossing, SpectrumResult
 
 # --- define colors ---
 rgb_2mpl = lambda R, G, B: np.array((R, G, B)) / 255
@@ -216,8 +216,13 @@ def plot_signal_modulus(axs, time_vector, signal, modulus, periods, p_max=None):
     """
     Plot the signal and the wavelet power spectrum.
     axs[0] is signal axis, axs[1] spectrum axis
+
+    *modulus* can also be a core.SpectrumResult
     """
 
+    if isinstance(modulus, SpectrumResult):
+        modulus = modulus.modulus
+
     sig_ax = axs[0]
     mod_ax = axs[1]
 
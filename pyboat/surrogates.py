@@ -0,0 +1,351 @@
+''' Monte Carlo significance of Wavelet power from surrogate signals '''
+
+from contextlib import closing
+from functools import partial
+
+import numpy as np
+
+from pyboat import core
+from pyboat.ensemble import (
+    prepare_signal,
+    worker_filter_bank,
+    pool_imap,
+    collect_signals,
+)
+
+# log-spaced bins for the power histograms, the
+# power is normalized to the signal variance
+power_bins = np.logspace(-6, 4, 4001)
+
+# number of surrogates transformed together, bounds
+# the memory of a worker independent of the batch size
+spectra_block_size = 8
+
+
+def ar1_null(signal, n_surrogates, rng):
+
+    '''
+    Default null model, AR1 realizations with the
+    lag-1 autocorrelation and the variance of the *signal*,
+    started from the stationary distribution.
+
+    Any other null model has to follow this signature and
+    return an array of shape (n_surrogates, len(signal)).
+    '''
+
+    alpha = core.ar1_estimate(signal)
+    std = np.std(signal)
+    # innovations for the stationary variance
+    sigma = std * np.sqrt(1 - alpha ** 2)
+    x0 = rng.standard_normal(n_surrogates) * std
+
+    return core.ar1_sim(
+        alpha, len(signal), sigma, x0=x0, n_realizations=n_surrogates, rng=rng
+    )
+
+
+def coi_free_mask(Nt, dt, periods):
+
+    '''
+    Boolean mask, True outside the cone of influence. Periods
+    lying entirely inside the COI keep all time points.
+    '''
+
+    tvec = np.arange(Nt) * dt
+    dist = np.minimum(tvec, tvec[-1] - tvec)
+    mask = np.asarray(periods)[:, None] <= core.Morlet_COI() * dist[None, :]
+    mask[~mask.any(axis=1)] = True
+
+    return mask
+
+
+def power_histograms(modulus, mask=None):
+
+    '''
+    Histograms of the power per period over *power_bins*, pooled over
+    time and a stack of spectra of shape (Nsignals, Nperiods, Nt).
+    Only the points where *mask* is True get counted.
+
+    Returns an integer array of shape (Nperiods, len(power_bins) + 1),
+    the first and last bins count under- and overflows.
+    '''
+
+    Nperiods = modulus.shape[-2]
+    Nbins = len(power_bins) + 1
+
+    inds = np.searchsorted(power_bins, modulus)
+    # one block of bins per period
+    inds += np.arange(Nperiods)[:, None] * Nbins
+    if mask is not None:
+        inds = inds[..., mask]
+
+    counts = np.bincount(inds.ravel(), minlength=Nperiods * Nbins)
+
+    return counts.reshape(Nperiods, Nbins)
+
+
+def histogram_quantiles(counts, quantiles):
+
+    '''
+    The *quantiles* per period from the *counts* of power_histograms,
+    interpolated log-linearly within the bins.
+
+    Returns an array of shape (len(quantiles), Nperiods).
+    '''
+
+    cdf = np.cumsum(counts, axis=1) / counts.sum(axis=1, keepdims=True)
+    log_bins = np.log(power_bins)
+
+    res = np.empty((len(quantiles), counts.shape[0]))
+    for i, q in enumerate(quantiles):
+        for j, row in enumerate(cdf):
+            k = np.searchsorted(row, q)
+            # under- or overflow
+            if k == 0 or k >= len(power_bins):
+                res[i, j] = power_bins[min(k, len(power_bins) - 1)]
+                continue
+            # bin k spans power_bins[k-1]..power_bins[k]
+            frac = (q - row[k - 1]) / (row[k] - row[k - 1])
+            res[i, j] = np.exp(log_bins[k - 1] + frac * (log_bins[k] - log_bins[k - 1]))
+
+    return res
+
+
+def _surrogate_batch(item, signal, dt, periods, null, exclude_coi):
+
+    '''
+    Histogram counts of one batch of surrogates, worker entry point,
+    *item* is a (seed_seq, n_surrogates) tuple. The spectra get
+    computed for blocks of *spectra_block_size* surrogates at a time
+    sharing the wavelets, and are binned right away.
+    '''
+
+    seed_seq, n_surrogates = item
+    rng = np.random.default_rng(seed_seq)
+    surrogates = null(signal, n_surrogates, rng)
+
+    Nt = len(signal)
+    # statistics only, the faster engine is accurate enough
+    filter_bank = worker_filter_bank(Nt, dt, periods, engine='fft')
+    mask = coi_free_mask(Nt, dt, periods) if exclude_coi else None
+
+    counts = 0
+    for start in range(0, n_surrogates, spectra_block_size):
+        block = surrogates[start : start + spectra_block_size]
+        modulus = core.compute_spectra(block, dt, periods, filter_bank=filter_bank)
+        counts = counts + power_histograms(modulus, mask)
+
+    return counts
+
+
+def surrogate_quantiles(
+    signal,
+    dt,
+    periods,
+    n_surrogates=1000,
+    quantiles=(0.95, 0.99),
+    null=None,
+    batch_size=50,
+    seed=None,
+    rtol=1e-2,
+    min_surrogates=200,
+    exclude_coi=True,
+    n_workers=1,
+    progress=None,
+):
+
+    '''
+    Empirical quantiles of the Wavelet power per period under
+    a null model, estimated from Monte Carlo surrogates.
+
+    The surrogates get generated and transformed in batches, every
+    batch draws from its own random stream spawned from *seed*, so
+    the results are reproducible independent of *n_workers*.
+    Stops early once the quantiles change by less than *rtol*
+    from one batch to the next.
+
+    Parameters
+    ----------
+
+    signal  : 1d ndarray, the (detrended) signal to be analyzed
+
+    dt      : the sampling interval scaled to desired time units
+
+    periods : the periods of the Wavelet spectrum
+
+    n_surrogates : maximal number of surrogates
+
+    quantiles : sequence of quantiles to estimate
+
+    null    : callable *null(signal, n, rng)* returning n surrogates
+              as rows of an array, defaults to ar1_null
+
+    batch_size : number of surrogates per task, drawn from one
+                 random stream, see also spectra_block_size
+
+    seed    : int or numpy.random.SeedSequence, None for fresh entropy
+
+    rtol    : relative tolerance for early stopping,
+              None to always use all *n_surrogates*
+
+    min_surrogates : number of surrogates before early stopping
+                     gets considered
+
+    exclude_coi : bool, if True only power outside the cone
+                  of influence enters the statistics
+
+    n_workers : number of processes, None uses all cores
+
+    progress  : optional callable, gets called with the number
+                of processed and the maximal number of surrogates
+
+    Returns
+    -------
+
+    power_quantiles : ndarray of shape (len(quantiles), len(periods)),
+                      compare to the modulus normalized by the signal
+                      variance, see surrogate_significance
+
+    n_used : number of surrogates used
+    '''
+
+    if null is None:
+        null = ar1_null
+
+    signal = np.asarray(signal, dtype=float)
+    periods = np.asarray(periods, dtype=float)
+
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+
+    n_batches = int(np.ceil(n_surrogates / batch_size))
+    seeds = seed.spawn(n_batches)
+    # the last batch holds the remainder
+    sizes = [min(batch_size, n_surrogates - i * batch_size) for i in range(n_batches)]
+    items = list(zip(seeds, sizes))
+
+    worker = partial(
+        _surrogate_batch,
+        signal=signal,
+        dt=float(dt),
+        periods=periods,
+        null=null,
+        exclude_coi=exclude_coi,
+    )
+
+    def accumulate(batches):
+
+        counts = 0
+        previous = None
+        n_used = 0
+        # batches arrive in order, early stopping is deterministic
+        for size, counts_batch in zip(sizes, batches):
+            counts = counts + counts_batch
+            n_used += size
+            current = histogram_quantiles(counts, quantiles)
+
+            if progress is not None:
+                progress(n_used, n_surrogates)
+
+            if (
+                rtol is not None
+                and previous is not None
+                and n_used >= min_surrogates
+                and np.all(np.abs(current - previous) <= rtol * np.abs(previous))
+            ):
+                break
+            previous = current
+
+        return current, n_used
+
+    # closing the pool terminates the remaining batches
+    with closing(pool_imap(worker, items, n_workers, chunksize=1)) as batches:
+        return accumulate(batches)
+
+
+def surrogate_significance(modulus, power_quantiles):
+
+    '''
+    Boolean masks of the Wavelet power *modulus* (or a SpectrumResult),
+    one for each row of *power_quantiles* as returned by
+    surrogate_quantiles, True where the power exceeds that quantile.
+    '''
+
+    if isinstance(modulus, core.SpectrumResult):
+        modulus = modulus.modulus
+
+    return [modulus > quantile[:, None] for quantile in power_quantiles]
+
+
+def _ensemble_item(item, wlet_pars, dt, periods, **kwargs):
+
+    ''' Quantiles for one (signal_id, signal, seed) item, worker entry point '''
+
+    signal_id, signal, seed = item
+    signal = prepare_signal(signal, dt, wlet_pars.get('T_c'), wlet_pars.get('L'))
+    if signal is None:
+        return signal_id, None
+
+    power_quantiles, _ = surrogate_quantiles(signal, dt, periods, seed=seed, **kwargs)
+
+    return signal_id, power_quantiles
+
+
+def ensemble_surrogate_quantiles(
+    df,
+    dt,
+    wlet_pars,
+    n_surrogates=1000,
+    quantiles=(0.95, 0.99),
+    null=None,
+    batch_size=50,
+    seed=None,
+    rtol=1e-2,
+    min_surrogates=200,
+    exclude_coi=True,
+    n_workers=None,
+    progress=None,
+):
+
+    '''
+    Surrogate power quantiles for all signals (columns) of the
+    DataFrame *df*, the signals are distributed over a pool
+    of processes. Each signal gets its own random stream spawned
+    from *seed*, the preprocessing follows *wlet_pars*, see
+    ensemble.ensemble_ridges. The other parameters are as for
+    surrogate_quantiles, *progress* gets called with the number of
+    processed signals.
+
+    Returns a dictionary with the signal_ids as keys and the
+    power quantiles of shape (len(quantiles), len(periods)) as values.
+    '''
+
+    periods = np.linspace(
+        wlet_pars['T_min'],
+        wlet_pars['T_max'],
+        wlet_pars['step_num'])
+
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+
+    seeds = seed.spawn(df.shape[1])
+    items = [
+        (signal_id, df[signal_id].to_numpy(), sseed)
+        for signal_id, sseed in zip(df, seeds)
+    ]
+
+    worker = partial(
+        _ensemble_item,
+        wlet_pars=wlet_pars,
+        dt=float(dt),
+        periods=periods,
+        n_surrogates=n_surrogates,
+        quantiles=quantiles,
+        null=null,
+        batch_size=batch_size,
+        rtol=rtol,
+        min_surrogates=min_surrogates,
+        exclude_coi=exclude_coi,
+    )
+
+    return collect_signals(pool_imap(worker, items, n_workers, chunksize=1), progress)
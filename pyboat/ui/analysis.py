@@ -115,7 +115,10 @@ class WaveletAnalyzer(QWidget):
         self.anneal_pars = None
 
         #=============Compute Spectrum=============================================
-        self.modulus, self.wlet = core.compute_spectrum(self.signal, dt, self.periods)
+        # use all cores for the single (long) signal
+        self.modulus, self.wlet = core.compute_spectrum(
+            self.signal, dt, self.periods, n_workers=-1
+        )
         #==========================================================================
 
 
@@ -199,6 +202,28 @@ class WaveletAnalyzer(QWidget):
         maxRidgeButton.setSizePolicy(QSizePolicy.Minimum, QSizePolicy.Fixed)
         maxRidgeButton.clicked.connect(self.do_maxRidge_detection)
 
+        # optimal smooth ridge by dynamic programming
+        dpRidgeButton = QPushButton('Detect Smooth Ridge', self)
+        dpRidgeButton.setSizePolicy(QSizePolicy.Minimum, QSizePolicy.Fixed)
+        dpRidgeButton.setToolTip('Ridge with bounded jumps and curvature cost,\nfound exactly by dynamic programming')
+        dpRidgeButton.clicked.connect(self.do_dpRidge_detection)
+
+        jump_label = QLabel("Max. Jump:")
+        jump_edit = QLineEdit('3')
+        jump_edit.setToolTip(f'Maximal jump of the smooth ridge in period steps, at most {core.dp_max_jump}')
+        jump_edit.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+        jump_edit.setMinimumSize(50,0)
+        jump_edit.setValidator( QIntValidator(bottom = 1, top = core.dp_max_jump) )
+        self.jump_edit = jump_edit
+
+        curve_label = QLabel("Curvature Cost:")
+        curve_edit = QLineEdit('0')
+        curve_edit.setToolTip('Penalizes the curvature of the smooth ridge')
+        curve_edit.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
+        curve_edit.setMinimumSize(50,0)
+        curve_edit.setValidator(posfloatV)
+        self.curve_edit = curve_edit
+
         # remove annealing, too slow.. not well implemented
         # annealRidgeButton = QPushButton('Set up ridge\nfrom annealing', self)
         # annealRidgeButton.clicked.connect(self.set_up_anneal)
@@ -234,6 +259,12 @@ class WaveletAnalyzer(QWidget):
         ridge_opt_layout.addWidget(smooth_label,1,1)
         ridge_opt_layout.addWidget(ridge_smooth_edit,1,2)
 
+        ridge_opt_layout.addWidget(dpRidgeButton,0,3,1,1)
+        ridge_opt_layout.addWidget(jump_label,0,4)
+        ridge_opt_layout.addWidget(jump_edit,0,5)
+        ridge_opt_layout.addWidget(curve_label,1,4)
+        ridge_opt_layout.addWidget(curve_edit,1,5)
+
         # for spacing
         rtool_box = QWidget()
         rtool_layout = QHBoxLayout()
@@ -318,6 +349,29 @@ class WaveletAnalyzer(QWidget):
         self.draw_ridge() # ridge_data made here
 
 
+    def do_dpRidge_detection(self):
+
+        # empty line edits fall back to the defaults
+        jump_text = self.jump_edit.text()
+        max_jump = int(jump_text) if jump_text else 3
+        curve_text = self.curve_edit.text().replace(',','.')
+        curve_pen = float(curve_text) if curve_text else 0
+
+        if not 1 <= max_jump <= core.dp_max_jump:
+            self.e = MessageWindow(f'Maximal jump must be between\n1 and {core.dp_max_jump}!',
+                                   'Value Error')
+            return
+
+        if self.DEBUG:
+            print(f'dp ridge with max_jump={max_jump}, curve_pen={curve_pen}')
+
+        ridge_y, cost = core.find_ridge_dp(self.modulus, max_jump = max_jump,
+                                           curve_pen = curve_pen)
+        self.ridge = ridge_y
+
+        self._has_ridge = True
+        self.draw_ridge() # ridge_data made here
+
     def draw_ridge(self):
 
         ''' makes also the ridge_data !! '''
@@ -418,8 +472,10 @@ class WaveletAnalyzer(QWidget):
         # get modulus index of initial straight line ridge
         y0 = np.where(self.periods < ini_per)[0][-1]
 
-        ridge_y, cost = core.find_ridge_anneal(self.modulus, y0, ini_T, Nsteps,
-                                             mx_jump = max_jump, curve_pen = curve_pen)
+        # independent restarts on all cores, keep the best ridge
+        ridge_y, cost = core.find_ridge_anneal_restarts(self.modulus, y0, ini_T, Nsteps,
+                                                        restarts=4, mx_jump = max_jump,
+                                                        curve_pen = curve_pen)
         
         self.ridge = ridge_y
 
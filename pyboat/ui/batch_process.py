@@ -79,6 +79,10 @@ class BatchProcessWindow(QWidget):
         ridge_options_layout.addWidget(thresh_edit, 0,1)
         ridge_options_layout.addWidget(smooth_label, 1,0)
         ridge_options_layout.addWidget(smooth_edit, 1,1)
+
+        self.cb_significance = QCheckBox('Significant Ridge Points Only')
+        self.cb_significance.setToolTip('Keeps only ridge points with power significant\nagainst an AR1 background at the 95% level')
+        ridge_options_layout.addWidget(self.cb_significance, 2,0,1,2)
         ridge_options.setLayout(ridge_options_layout)
 
         # -- Plotting Options --
@@ -101,6 +105,8 @@ class BatchProcessWindow(QWidget):
         export_options.setChecked(False)        
         self.cb_specs = QCheckBox('Wavelet Spectra')
         self.cb_specs.setToolTip("Saves the individual wavelet spectra as images (png's)")
+        self.cb_specs_npy = QCheckBox('Wavelet Spectra as Arrays')
+        self.cb_specs_npy.setToolTip("Writes the individual wavelet power spectra directly\nto disc as numpy arrays (npy's) for later reanalysis")
 
         self.cb_readout = QCheckBox('Ridge Readouts')
         self.cb_readout.setToolTip('Saves one data frame per signal to disc as csv')
@@ -135,6 +141,7 @@ class BatchProcessWindow(QWidget):
         lo.addWidget(self.cb_specs,0,0)
         lo.addWidget(self.cb_readout,1,0)
         lo.addWidget(self.cb_readout_plots,2,0)
+        lo.addWidget(self.cb_specs_npy,3,0)
         #lo.addWidget(line1, 3,0)        
         lo.addWidget(self.cb_sorted_powers,4,0)
         lo.addWidget(self.cb_save_ensemble_dynamics,5,0)
@@ -201,6 +208,8 @@ class BatchProcessWindow(QWidget):
         # is a dictionary holding the ridge-data
         # for each signal and the signal_id as key
         ridge_results = self.do_the_loop()
+        if ridge_results is None:
+            return
 
         # compute the time-averaged powers
         if self.cb_power_dis.isChecked() or self.cb_sorted_powers.isChecked():
@@ -355,6 +364,7 @@ class BatchProcessWindow(QWidget):
 
         '''
 
+        OutPath = None
         if self.export_options.isChecked():
             OutPath = self.get_OutPath()
             if OutPath is None:
@@ -368,7 +378,42 @@ class BatchProcessWindow(QWidget):
         # retrieve batch settings
         power_thresh = self.get_thresh()
         rsmooth = self.get_ridge_smooth()
+
+        # only the ridges are needed, distribute over all cores
+        if not self.cb_specs.isChecked() and not (
+                self.export_options.isChecked() and self.cb_specs_npy.isChecked()):
+
+            ridge_results = pyboat.ensemble_ridges(
+                self.parentDV.df,
+                self.parentDV.dt,
+                self.wlet_pars,
+                power_thresh,
+                smoothing_wsize = rsmooth,
+                significance = 95 if self.cb_significance.isChecked() else None,
+                progress = lambda n: self.progress.setValue(n - 1))
+
+            for signal_id, ridge_data in ridge_results.items():
+                self.save_readout(signal_id, ridge_data, OutPath)
+
+            return ridge_results
         
+        # the precomputed wavelets get shared
+        # between all signals of the same length
+        filter_bank = None
+
+        # detrend and normalize all signals at once
+        ana_df = self.parentDV.df
+        if self.parentDV.cb_use_detrended.isChecked():
+            T_c = self.parentDV.get_T_c(self.parentDV.T_c_edit)
+            if not T_c:
+                return
+            ana_df = pyboat.sinc_detrend_frame(ana_df, T_c, self.parentDV.dt)
+            
+        if self.parentDV.cb_use_envelope.isChecked():
+            if self.debug:
+                print('Calculating envelopes with L=',self.wlet_pars['L'])
+            ana_df = pyboat.normalize_frame(ana_df, self.wlet_pars['L'], self.parentDV.dt)
+
         ridge_results = {}
         for i, signal_id in enumerate(self.parentDV.df):
 
@@ -382,28 +427,31 @@ class BatchProcessWindow(QWidget):
                 print(f"Can't process signal {signal_id}..")
                 continue
 
-            # detrend?!
-            if self.parentDV.cb_use_detrended.isChecked():
-                trend = self.parentDV.calc_trend()
-                signal = self.parentDV.raw_signal - trend
-            else:
-                signal = self.parentDV.raw_signal
-            
-            # amplitude normalization?
-            if self.parentDV.cb_use_envelope.isChecked():
-                if self.debug:
-                    print('Calculating envelope with L=',self.wlet_pars['L'])
-                signal = pyboat.normalize_with_envelope(
-                    signal,
-                    self.wlet_pars['L'],
-                    self.parentDV.dt)
+            # the detrended and/or normalized signal
+            signal = ana_df[signal_id].to_numpy()
+            signal = signal[~np.isnan(signal)]
                 
+            if filter_bank is None or not filter_bank.matches(
+                    len(signal), self.parentDV.dt, periods):
+                filter_bank = pyboat.FilterBank(len(signal), self.parentDV.dt, periods)
+
+            # generate time vector
+            tvec = np.arange(len(signal)) * self.parentDV.dt
+
+            # write the power spectrum directly to disc
+            if self.export_options.isChecked() and self.cb_specs_npy.isChecked():
+                spec_out = f'{OutPath}/{signal_id}_wspec.npy'
+                if self.debug:
+                    print(f'Writing spectrum of {signal_id} to {spec_out}')
+            else:
+                spec_out = None
+
             # compute the spectrum
-            modulus, wlet = pyboat.compute_spectrum(signal, self.parentDV.dt, periods )
+            modulus, wlet = pyboat.compute_spectrum(signal, self.parentDV.dt, periods,
+                                                    filter_bank = filter_bank,
+                                                    out = spec_out)
             # get maximum ridge
             ridge = pyboat.get_maxRidge_ys(modulus)
-            # generate time vector
-            tvec = np.arange(len(signal)) * self.parentDV.dt
             # evaluate along the ridge
             ridge_data = pyboat.eval_ridge(
                 ridge,
@@ -413,6 +461,10 @@ class BatchProcessWindow(QWidget):
                 tvec,
                 power_thresh,
                 smoothing_wsize = rsmooth)
+
+            if self.cb_significance.isChecked():
+                ridge_data = pyboat.significant_ridge(
+                    ridge_data, signal, self.parentDV.dt)
             ridge_results[signal_id] = (ridge_data)
 
             # -- Save out individual results --
@@ -433,24 +485,36 @@ class BatchProcessWindow(QWidget):
                 plt.savefig(fname)
                 plt.close()
 
-            if self.cb_readout_plots.isChecked():
-                pl.plot_readout(ridge_data)
-                fname = f'{OutPath}/{signal_id}_readout.png'
-                if self.debug:
-                    print(f'Plotting and saving {signal_id} to {fname}')                
-                plt.savefig(fname)
-                plt.close()
-                
-            if self.cb_readout.isChecked():
-                fname = f'{OutPath}/{signal_id}_readout.csv'
-                if self.debug:
-                    print(f'Saving ridge reatout to {fname}')
-                ridge_data.to_csv(fname, sep = ',', float_format = '%.3f', index = False)                
+            self.save_readout(signal_id, ridge_data, OutPath)
 
             self.progress.setValue(i)
             
         return ridge_results
 
+    def save_readout(self, signal_id, ridge_data, OutPath):
+
+        '''
+        Plots and/or saves the ridge readout of
+        a single signal as requested by the checkboxes.
+        '''
+
+        if OutPath is None:
+            return
+        
+        if self.cb_readout_plots.isChecked():
+            pl.plot_readout(ridge_data)
+            fname = f'{OutPath}/{signal_id}_readout.png'
+            if self.debug:
+                print(f'Plotting and saving {signal_id} to {fname}')                
+            plt.savefig(fname)
+            plt.close()
+
+        if self.cb_readout.isChecked():
+            fname = f'{OutPath}/{signal_id}_readout.csv'
+            if self.debug:
+                print(f'Saving ridge reatout to {fname}')
+            ridge_data.to_csv(fname, sep = ',', float_format = '%.3f', index = False)
+
 
 class PowerDistributionWindow(QWidget):
     def __init__(self, powers, dataset_name, parent = None):
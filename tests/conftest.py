@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def chirp():
+
+    ''' Noisy chirp with a linear trend, sampled with dt = 2 '''
+
+    rng = np.random.default_rng(42)
+    tvec = np.arange(1000) * 2.0
+    signal = np.cos(2 * np.pi * tvec / (40 + tvec / 50)) + 0.01 * tvec
+    return signal + rng.normal(0, 0.5, len(tvec))
+
+
+@pytest.fixture
+def periods():
+    return np.linspace(10, 150, 60)
@@ -0,0 +1,26 @@
+''' The AR1 simulator against the explicit recursion '''
+
+import numpy as np
+
+from pyboat import core
+
+
+def test_ar1_sim():
+
+    alpha, sigma, N = 0.7, 0.5, 200
+
+    sol = core.ar1_sim(alpha, N, sigma, n_realizations=3, rng=np.random.default_rng(1))
+    assert sol.shape == (3, N)
+
+    # the same draws, by the loop
+    noise = np.random.default_rng(1).standard_normal((3, N))
+    reference = np.empty((3, N))
+    reference[:, 0] = noise[:, 0]
+    for i in range(1, N):
+        reference[:, i] = alpha * reference[:, i - 1] + sigma * noise[:, i]
+
+    assert np.allclose(sol, reference, rtol=0, atol=1e-12)
+
+    # given initial values
+    sol = core.ar1_sim(alpha, N, sigma, x0=[0, 1, 2], n_realizations=3)
+    assert np.array_equal(sol[:, 0], [0, 1, 2])
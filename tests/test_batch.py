@@ -0,0 +1,115 @@
+''' Table-level preprocessing, the ensemble runner and surrogate statistics '''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyboat import core, ensemble, surrogates
+
+dt = 1.0
+
+
+@pytest.fixture
+def frame():
+
+    ''' Random walks of different lengths, padded with NaNs '''
+
+    rng = np.random.default_rng(7)
+    df = pd.DataFrame(rng.normal(size=(300, 4)).cumsum(axis=0))
+    df.iloc[:30, 1] = np.nan
+    df.iloc[250:, 3] = np.nan
+    return df
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_ensemble_ridges(frame, n_workers):
+
+    wlet_pars = dict(T_min=5, T_max=60, step_num=40, T_c=50, L=40)
+    periods = np.linspace(5, 60, 40)
+
+    results = ensemble.ensemble_ridges(frame, dt, wlet_pars, n_workers=n_workers)
+    assert list(results) == list(frame.columns)
+
+    # the single signal analysis as done by the WAnalyzer
+    for col, ridge_data in results.items():
+        signal = frame[col].dropna().to_numpy()
+        signal = signal - core.sinc_smooth(signal, 50, dt)
+        signal = core.normalize_with_envelope(signal, 40, dt)
+        modulus, wlet = core.compute_spectrum(signal, dt, periods)
+        tvec = np.arange(len(signal)) * dt
+        reference = core.eval_ridge(
+            core.get_maxRidge_ys(modulus), wlet, signal, periods, tvec
+        )
+
+        assert np.array_equal(ridge_data.periods, reference.periods)
+        assert np.allclose(ridge_data.power, reference.power, rtol=1e-10)
+
+
+def test_significant_ridge(frame):
+
+    wlet_pars = dict(T_min=5, T_max=60, step_num=40, T_c=50, L=False)
+    filtered = ensemble.ensemble_ridges(frame, dt, wlet_pars, significance=95, n_workers=1)
+    full = ensemble.ensemble_ridges(frame, dt, wlet_pars, n_workers=1)
+
+    for col, ridge_data in filtered.items():
+        signal = core.sinc_detrend_frame(frame, 50, dt)[col].dropna().to_numpy()
+        alpha = core.ar1_estimate(signal)
+        mask = core.ridge_significance(full[col], alpha, dt, 95)
+
+        assert 0 < len(ridge_data) < len(full[col])
+        assert np.array_equal(ridge_data.time, full[col].time[mask])
+        # positions for find_COI_crossing
+        assert np.array_equal(ridge_data.index, np.arange(len(ridge_data)))
+
+
+def test_surrogate_quantiles():
+
+    rng = np.random.default_rng(0)
+    signal = rng.normal(size=400).cumsum() * 0.1 + rng.normal(size=400)
+    signal = signal - core.sinc_smooth(signal, 80, dt)
+    periods = np.linspace(5, 60, 30)
+    seed, sizes = 3, (50, 50, 30)
+
+    kwargs = dict(n_surrogates=sum(sizes), batch_size=50, seed=seed, rtol=None)
+    q, n_used = surrogates.surrogate_quantiles(signal, dt, periods, **kwargs)
+    q2, _ = surrogates.surrogate_quantiles(signal, dt, periods, n_workers=2, **kwargs)
+
+    assert n_used == sum(sizes)
+    assert np.array_equal(q, q2)
+
+    # the same surrogates, quantiles from the full power arrays
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    modulus = np.concatenate(
+        [
+            core.compute_spectra(
+                surrogates.ar1_null(signal, size, np.random.default_rng(sseed)),
+                dt,
+                periods,
+            )
+            for sseed, size in zip(seeds, sizes)
+        ]
+    )
+    mask = surrogates.coi_free_mask(len(signal), dt, periods)
+    reference = np.array(
+        [
+            [np.quantile(modulus[:, i, mask[i]], quantile) for i in range(len(periods))]
+            for quantile in (0.95, 0.99)
+        ]
+    )
+
+    # limited by the histogram bin width of ~0.6%
+    assert np.allclose(q, reference, rtol=1e-2)
+
+
+def test_surrogate_early_stopping():
+
+    signal = np.random.default_rng(1).normal(size=300)
+    periods = np.linspace(5, 50, 20)
+
+    kwargs = dict(n_surrogates=400, batch_size=20, seed=1, rtol=0.05, min_surrogates=40)
+    q, n_used = surrogates.surrogate_quantiles(signal, dt, periods, **kwargs)
+    q2, n_used2 = surrogates.surrogate_quantiles(signal, dt, periods, n_workers=2, **kwargs)
+
+    assert n_used < 400
+    assert n_used == n_used2
+    assert np.array_equal(q, q2)
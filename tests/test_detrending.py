@@ -0,0 +1,115 @@
+''' Detrending filters and amplitude envelopes against their direct versions '''
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyboat import core
+
+dt = 1.0
+
+
+@pytest.fixture
+def walk():
+    return np.random.default_rng(3).normal(size=1500).cumsum()
+
+
+@pytest.mark.parametrize("window_len", [11, 301])
+def test_fft_smoothing(walk, window_len):
+
+    direct = core.smooth(walk, window_len, method="direct")
+    fft = core.smooth(walk, window_len, method="fft")
+
+    assert np.allclose(fft, direct, rtol=0, atol=1e-10 * np.abs(walk).max())
+
+    direct = core.sinc_smooth(walk, 100, dt, method="direct")
+    fft = core.sinc_smooth(walk, 100, dt, method="fft")
+
+    assert np.allclose(fft, direct, rtol=0, atol=1e-10 * np.abs(walk).max())
+
+
+def test_sinc_filter():
+
+    M, f_c = 100, 0.05
+
+    # the windowed sinc, sample by sample
+    reference = []
+    for x in range(M + 1):
+        if x == M / 2:
+            reference.append(2 * np.pi * f_c)
+            continue
+        r = np.sin(2 * np.pi * f_c * (x - M / 2)) / (x - M / 2)
+        r *= 0.42 - 0.5 * np.cos(2 * np.pi * x / M) + 0.08 * np.cos(4 * np.pi * x / M)
+        reference.append(r)
+    reference = np.array(reference) / np.sum(reference)
+
+    assert np.allclose(core.sinc_filter(M, f_c), reference, rtol=1e-12, atol=0)
+
+
+@pytest.fixture
+def frame():
+
+    ''' Random walks of different lengths, padded with NaNs '''
+
+    rng = np.random.default_rng(7)
+    df = pd.DataFrame(rng.normal(size=(300, 4)).cumsum(axis=0))
+    df.iloc[:30, 1] = np.nan
+    df.iloc[250:, 3] = np.nan
+    return df
+
+
+def test_sinc_detrend_frame(frame):
+
+    detrended = core.sinc_detrend_frame(frame, 50, dt)
+
+    for col in frame:
+        signal = frame[col].dropna().to_numpy()
+        reference = signal - core.sinc_smooth(signal, 50, dt)
+        assert np.isnan(detrended[col]).sum() == np.isnan(frame[col]).sum()
+        assert np.allclose(detrended[col].dropna(), reference, rtol=0, atol=1e-10)
+
+
+def test_auto_sinc_M():
+
+    T_c, N, tol = 50, 2000, 1e-2
+    M, error = core.auto_sinc_M(T_c, dt, N, tol)
+
+    assert M % 2 == 0 and M < N - 1
+    assert error <= tol
+    assert error == core.sinc_filter_error(M, dt / T_c)
+    # the next shorter filter misses the tolerance
+    assert core.sinc_filter_error(M - 2, dt / T_c) > tol
+
+
+def test_sliding_window_amplitude(walk):
+
+    window_size = 41
+    half = window_size // 2
+
+    # max - min over the window, truncated at the boundaries
+    reference = np.array(
+        [
+            np.ptp(walk[max(i - half, 0) : i + half + 1]) / 2
+            for i in range(len(walk))
+        ]
+    )
+    envelope = core.sliding_window_amplitude(walk, window_size, dt, SGsmooth=False)
+
+    assert np.array_equal(envelope, reference)
+
+
+def test_normalize_frame(frame):
+
+    normalized = core.normalize_frame(frame, 40, dt)
+
+    for col in frame:
+        signal = frame[col].dropna().to_numpy()
+        reference = core.normalize_with_envelope(signal, 40, dt)
+        assert np.isnan(normalized[col]).sum() == np.isnan(frame[col]).sum()
+        assert np.allclose(normalized[col].dropna(), reference, rtol=0, atol=1e-12)
+
+    # the 2d envelope, row by row
+    signals = frame.dropna().to_numpy().T
+    envelopes = core.sliding_window_amplitude(signals, 40, dt)
+    for signal, envelope in zip(signals, envelopes):
+        assert np.allclose(envelope, core.sliding_window_amplitude(signal, 40, dt))
@@ -0,0 +1,128 @@
+''' Ridge detection by dynamic programming, annealing and coarse to fine search '''
+
+import itertools
+
+import numpy as np
+import pytest
+
+from pyboat import core
+
+
+@pytest.fixture
+def landscape():
+
+    ''' Noise with a sinusoidal ridge of power 3 on top '''
+
+    rng = np.random.default_rng(0)
+    Ns, Nt = 40, 400
+    landscape = rng.random((Ns, Nt))
+    ridge = (20 + 8 * np.sin(np.arange(Nt) / 40)).astype(int)
+    landscape[ridge, np.arange(Nt)] += 3
+    return landscape
+
+
+def cost(ys, landscape, curve_pen):
+    return core.cost_func_anneal(
+        np.asarray(ys), np.arange(landscape.shape[1]), landscape, 0, curve_pen * 0.01
+    )
+
+
+@pytest.mark.parametrize("curve_pen", [0, 5])
+def test_dp_brute_force(curve_pen):
+
+    rng = np.random.default_rng(1)
+    landscape = rng.random((5, 6))
+    max_jump = 1
+
+    best = np.inf
+    for y0 in range(5):
+        for jumps in itertools.product((-1, 0, 1), repeat=5):
+            ys = y0 + np.cumsum((0,) + jumps)
+            if ys.min() < 0 or ys.max() > 4:
+                continue
+            best = min(best, cost(ys, landscape, curve_pen))
+
+    ys, F = core.find_ridge_dp(landscape, max_jump, curve_pen)
+
+    assert np.abs(np.diff(ys)).max() <= max_jump
+    assert F == pytest.approx(best, abs=1e-12)
+
+
+def test_dp_max_jump(landscape):
+
+    with pytest.raises(ValueError):
+        core.find_ridge_dp(landscape, core.dp_max_jump + 1)
+    with pytest.raises(ValueError):
+        core.find_ridge_dp(landscape, 0)
+
+
+@pytest.mark.parametrize("curve_pen", [0, 0.2, 5])
+def test_anneal(landscape, curve_pen):
+
+    ys, F = core.find_ridge_anneal(
+        landscape, 20, 0.2, 20000, 3, curve_pen, rng=np.random.default_rng(2)
+    )
+
+    # the accumulated local cost changes give the full cost
+    assert F == pytest.approx(cost(ys, landscape, curve_pen), abs=1e-10)
+    assert F < cost(np.full(landscape.shape[1], 20), landscape, curve_pen)
+    # no better than the exact optimum
+    assert F >= core.find_ridge_dp(landscape, 3, curve_pen)[1] - 1e-10
+
+
+def test_anneal_restarts(landscape):
+
+    kwargs = dict(restarts=3, seed=5, mx_jump=3, curve_pen=0.2, patience=500)
+    ys1, F1 = core.find_ridge_anneal_restarts(
+        landscape, 20, 0.2, 5000, n_workers=1, **kwargs
+    )
+    ys2, F2 = core.find_ridge_anneal_restarts(
+        landscape, 20, 0.2, 5000, n_workers=2, **kwargs
+    )
+
+    # reproducible independent of the number of processes
+    assert np.array_equal(ys1, ys2)
+    assert F1 == F2
+
+
+@pytest.mark.parametrize("sub_s, sub_t", [(2, 2), (3, 2), (4, 1)])
+def test_coarse_to_fine(landscape, sub_s, sub_t):
+
+    ys0, F0 = core.find_ridge_dp(landscape, 3, 0.5)
+    ys, F = core.find_ridge_coarse_to_fine(landscape, sub_s, sub_t, 3, 0.5)
+
+    # the optimal ridge lies within the refinement band
+    assert np.array_equal(ys, ys0)
+    assert F == pytest.approx(F0)
+
+
+def test_coarse_to_fine_anneal(landscape):
+
+    ys, F = core.find_ridge_coarse_to_fine(
+        landscape, 2, 3, 3, 0.5, method="anneal", rng=np.random.default_rng(1)
+    )
+
+    assert np.abs(np.diff(ys)).max() <= 3
+    assert F >= core.find_ridge_dp(landscape, 3, 0.5)[1] - 1e-10
+
+
+def test_block_reduce():
+
+    landscape = np.arange(35.0).reshape(5, 7)
+    coarse = core.block_reduce(landscape, 2, 3)
+
+    assert coarse.shape == (3, 3)
+    assert coarse[0, 0] == landscape[:2, :3].mean()
+    # incomplete blocks at the end
+    assert coarse[-1, -1] == landscape[4:, 6:].mean()
+
+
+def test_slope_limited():
+
+    ys = np.cumsum(np.random.default_rng(0).integers(-6, 7, 500))
+    limited = core.slope_limited(ys, 3)
+
+    assert np.abs(np.diff(limited)).max() <= 3
+    # already within the slope
+    ys = np.arange(0, 100, 2)
+    assert np.array_equal(core.slope_limited(ys, 3), ys)
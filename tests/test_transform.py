@@ -0,0 +1,201 @@
+''' Equivalence of the Wavelet transform engines and paths with the direct CWT '''
+
+import numpy as np
+import pytest
+
+from pyboat import core
+
+dt = 2.0
+
+
+@pytest.fixture
+def reference(chirp, periods):
+    return core.compute_spectrum(chirp, dt, periods)
+
+
+def rel_error(a, b):
+    return np.abs(a - b).max() / np.abs(b).max()
+
+
+@pytest.mark.parametrize("engine, tol", [("fft", 1e-5), ("multirate", 1e-4)])
+def test_engines(chirp, periods, reference, engine, tol):
+
+    modulus0, wlet0 = reference
+    modulus, wlet = core.compute_spectrum(chirp, dt, periods, engine=engine)
+
+    assert rel_error(wlet, wlet0) < tol
+    assert rel_error(modulus, modulus0) < tol
+    # no view into a larger buffer
+    assert wlet.flags["C_CONTIGUOUS"] and wlet.base is None
+
+
+def test_compute_spectra(chirp, periods, reference):
+
+    signals = np.vstack([chirp, chirp[::-1]])
+    modulus = core.compute_spectra(signals, dt, periods)
+    modulus1, _ = core.compute_spectrum(chirp[::-1], dt, periods)
+
+    assert rel_error(modulus[0], reference[0]) < 1e-5
+    assert rel_error(modulus[1], modulus1) < 1e-5
+
+
+def test_filter_bank(chirp, periods, reference):
+
+    # the default direct engine is bit-identical
+    bank = core.FilterBank(len(chirp), dt, periods)
+    modulus, wlet = core.compute_spectrum(chirp, dt, periods, filter_bank=bank)
+    assert np.array_equal(wlet, reference[1])
+
+    bank = core.FilterBank(len(chirp), dt, periods, engine="fft")
+    modulus, wlet = core.compute_spectrum(chirp, dt, periods, filter_bank=bank)
+    assert rel_error(wlet, reference[1]) < 1e-5
+
+    assert bank.matches(len(chirp), dt, periods)
+    assert not bank.matches(len(chirp), dt, periods, fraction=1e3)
+    assert not bank.matches(len(chirp) + 1, dt, periods)
+
+
+def test_kernel_cache(chirp, periods, reference):
+
+    core.clear_cache()
+    core.compute_spectrum(chirp, dt, periods, engine="fft")
+    misses = core.cache_info()["misses"]
+
+    # the second transform hits the cache and is identical
+    modulus, _ = core.compute_spectrum(chirp, dt, periods, engine="fft")
+    assert core.cache_info()["misses"] == misses
+    assert rel_error(modulus, reference[0]) < 1e-5
+
+    # clipping parameters are part of the key
+    Morlet = core.mk_Morlet(core.omega0)
+    scales = core.scales_from_periods(periods[:3], 1 / dt)
+    core.fourier_kernels(Morlet, scales, len(chirp), nfft=4096)
+    misses = core.cache_info()["misses"]
+    core.fourier_kernels(Morlet, scales, len(chirp), fraction=1e3, nfft=4096)
+    assert core.cache_info()["misses"] == misses + 3
+    core.fourier_kernels(Morlet, scales, len(chirp), False, nfft=4096)
+    assert core.cache_info()["misses"] == misses + 6
+
+    # bounded by the memory limit
+    core.set_cache_limit(2 ** 16)
+    assert core.cache_info()["nbytes"] <= 2 ** 16
+    core.set_cache_limit(256 * 2 ** 20)
+    core.clear_cache()
+
+
+def test_single_precision(chirp, periods, reference):
+
+    modulus, wlet = core.compute_spectrum(chirp, dt, periods, dtype=np.complex64)
+
+    assert wlet.dtype == np.complex64
+    assert modulus.dtype == np.float32
+    assert rel_error(wlet, reference[1]) < 1e-5
+
+
+def test_power_only(chirp, periods, reference):
+
+    modulus0, wlet0 = reference
+
+    modulus = core.compute_power(chirp, dt, periods, block_size=7)
+    assert np.array_equal(modulus, modulus0)
+
+    # the transform at single points
+    ridge_y = core.get_maxRidge_ys(modulus0)
+    z = core.wlet_at(chirp, dt, periods, ridge_y)
+    assert np.array_equal(z, wlet0[ridge_y, np.arange(len(chirp))])
+
+
+def test_streaming_ridge(chirp, periods, reference):
+
+    modulus0, wlet0 = reference
+    ridge_y = core.get_maxRidge_ys(modulus0)
+    tvec = np.arange(len(chirp)) * dt
+    rd0 = core.eval_ridge(ridge_y, wlet0, chirp, periods, tvec)
+
+    rd = core.compute_ridge(chirp, dt, periods, block_size=7)
+
+    assert np.array_equal(rd.periods, rd0.periods)
+    assert np.allclose(rd.power, rd0.power, rtol=1e-12)
+    assert np.allclose(rd.phase, rd0.phase, rtol=1e-12)
+
+
+@pytest.mark.parametrize("engine, tol", [("direct", 1e-12), ("fft", 1e-5)])
+def test_chunked(chirp, periods, reference, engine, tol):
+
+    modulus = np.empty_like(reference[0])
+    wlet = np.empty_like(reference[1])
+    core.compute_spectrum_chunked(
+        chirp, dt, periods, modulus, wlet, chunk_size=128, engine=engine
+    )
+
+    assert rel_error(wlet, reference[1]) < tol
+    assert rel_error(modulus, reference[0]) < tol
+
+
+def test_memmap_out(tmp_path, chirp, periods, reference):
+
+    modulus, wlet = core.compute_spectrum(
+        chirp,
+        dt,
+        periods,
+        out=tmp_path / "modulus.npy",
+        wlet_out=tmp_path / "wlet.npy",
+    )
+
+    assert isinstance(modulus, np.memmap)
+    assert np.array_equal(modulus, reference[0])
+    assert np.array_equal(np.load(tmp_path / "wlet.npy"), reference[1])
+
+    modulus, _ = core.compute_spectrum_chunked(
+        chirp, dt, periods, tmp_path / "chunked.npy", chunk_size=128, engine="direct"
+    )
+    assert isinstance(modulus, np.memmap)
+    assert rel_error(modulus, reference[0]) < 1e-12
+
+
+@pytest.mark.parametrize("engine", ["direct", "fft"])
+def test_threads(chirp, periods, engine):
+
+    modulus0, wlet0 = core.compute_spectrum(chirp, dt, periods, engine=engine)
+    modulus, wlet = core.compute_spectrum(
+        chirp, dt, periods, engine=engine, n_workers=3
+    )
+
+    # every row gets computed by the same code, just on another thread
+    assert np.array_equal(wlet, wlet0)
+    assert np.array_equal(modulus, modulus0)
+
+
+def test_online_cwt(chirp, periods):
+
+    # no mean subtraction for the online transform
+    signal = chirp - chirp.mean()
+    result = core.compute_spectrum(signal, dt, periods, as_result=True)
+
+    online = core.OnlineCWT(dt, periods, capacity=64)
+    for samples in np.array_split(signal, 17):
+        online.append(samples)
+
+    n_final = online.n_final
+    assert n_final > 0
+    assert rel_error(online.wlet[:, :n_final], result.wlet[:, :n_final]) < 1e-10
+    assert rel_error(online.modulus[:, :n_final], result.modulus[:, :n_final]) < 1e-10
+    assert online.coi_mask.shape == result.coi_mask.shape
+
+
+def test_spectrum_result(chirp, periods, reference):
+
+    result = core.compute_spectrum(chirp, dt, periods, as_result=True)
+    assert np.array_equal(result.modulus, reference[0])
+    assert np.array_equal(result.time_averaged, reference[0].mean(axis=1))
+
+    # changing the readout leaves the memoized one intact
+    ridge_data = result.get_ridge()
+    ridge_data["power"] = 0
+    assert np.all(result.get_ridge().power > 0)
+
+    # power only
+    power_only = core.SpectrumResult(None, chirp, periods, dt, modulus=reference[0])
+    assert np.array_equal(power_only.ridge_y, result.ridge_y)
+    with pytest.raises(ValueError):
+        core.eval_ridge(power_only.ridge_y, power_only)